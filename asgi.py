@@ -0,0 +1,38 @@
+"""ASGI-точка входа: uvicorn asgi:application
+
+Представления Flask остаются синхронными и выполняются в ограниченном пуле
+потоков (WEB_THREADS), поэтому медленная страница продавца не блокирует
+цикл событий и остальные запросы одного процесса. Независимые запросы к БД
+внутри страницы выполняются параллельно в пуле потоков БД
+(models.database.run_concurrently). Требует пакеты asgiref и uvicorn
+(см. requirements.txt).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+_request_executor = ThreadPoolExecutor(max_workers=int(os.getenv('WEB_THREADS', 8)),
+                                       thread_name_prefix='request')
+
+_wsgi_application = WsgiToAsgi(app)
+
+def _handle_request(scope, receive, send):
+    # WsgiToAsgi выполняет WSGI-приложение в потоке ближайшего внешнего
+    # async_to_sync, а без него — в одном общем потоке процесса. Здесь
+    # внешний async_to_sync вызывается из потока пула _request_executor,
+    # поэтому каждый запрос выполняется в своем потоке пула
+    async_to_sync(_wsgi_application)(scope, receive, send)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        # Пул соединений и кэш готовы при импорте приложения
+        while (await receive())['type'] != 'lifespan.shutdown':
+            await send({'type': 'lifespan.startup.complete'})
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+    await sync_to_async(_handle_request, thread_sensitive=False,
+                        executor=_request_executor)(scope, receive, send)
@@ -0,0 +1,6 @@
+"""Нагрузочные замеры: генератор синтетической выгрузки и прогон импорта и API.
+
+    python -m bench.generate 1m data/bench-1m.csv
+    python -m bench.run --rows 100k --output bench-results.json
+    python -m bench.compare old.json new.json
+"""
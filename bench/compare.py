@@ -0,0 +1,56 @@
+"""Сравнение двух результатов bench.run: изменение p50/p95 по эндпоинтам
+и времени импорта. С --threshold код возврата 1, если что-то замедлилось
+больше чем на заданный процент.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+def compare(old, new, metric='p50_ms'):
+    """Строки сравнения: (название, было, стало, изменение в %)"""
+    rows = []
+    for phase in ('bulk', 'delta'):
+        before = old['import'][phase]['seconds'] * 1000
+        after = new['import'][phase]['seconds'] * 1000
+        rows.append((f"import {phase}", before, after, _change(before, after)))
+    for name, result in new['endpoints'].items():
+        if name in old['endpoints']:
+            before = old['endpoints'][name][metric]
+            rows.append((name, before, result[metric], _change(before, result[metric])))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение результатов замеров")
+    parser.add_argument('old', type=Path)
+    parser.add_argument('new', type=Path)
+    parser.add_argument('--metric', choices=('p50_ms', 'p95_ms', 'mean_ms'), default='p50_ms')
+    parser.add_argument('--threshold', type=float,
+                        help="Допустимое замедление в процентах")
+    args = parser.parse_args(argv)
+
+    old = json.loads(args.old.read_text(encoding='utf-8'))
+    new = json.loads(args.new.read_text(encoding='utf-8'))
+    if old['meta']['rows'] != new['meta']['rows']:
+        print(f"Внимание: разный объем данных ({old['meta']['rows']} и {new['meta']['rows']})")
+
+    regressions = []
+    print(f"{'':40} {'было, мс':>12} {'стало, мс':>12} {'изм.':>8}")
+    for name, before, after, change in compare(old, new, args.metric):
+        change_text = f"{change:+.1f}%" if change is not None else '—'
+        print(f"{name:40} {before:12.2f} {after:12.2f} {change_text:>8}")
+        if args.threshold is not None and change is not None and change > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"Замедление больше {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Генератор синтетической выгрузки заказов в формате CSV, который читает
+data/import_data.py (разделитель ';', заголовки на русском, UTF-8 с BOM).
+
+Продавцы, организаторы и события распределены по закону Ципфа: немногие
+крупные продавцы дают большую часть заказов, как в реальных выгрузках.
+Доли статусов, возвратов, прямых продаж и заказов без агентского
+вознаграждения подобраны так, чтобы работали все бизнес-правила выручки.
+При одинаковом seed файл получается одинаковым.
+"""
+import argparse
+import csv
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+CSV_HEADERS = (
+    'ID заказа', 'Дата оформления', 'Время оформления (часы:минуты)',
+    'ФИО клиента', 'Емаил клиента', 'Тел клиента',
+    'Название события', 'Дата', 'Время',
+    'Компания-организатор (название)', 'Компания-продавец (название)',
+    'Кол-во билетов', 'Сумма заказа', 'Промокод', 'Процент/сумма скидки',
+    'Процент агентского вознаграждения', 'Процент комиссии системы',
+    'Сумма вознаграждения организатора', 'Сумма агентского вознаграждения',
+    'Сумма комиссии системы', 'Сумма скидки',
+    'Статус оплаты', 'Статус билета', 'Дата возврата', 'Сумма возврата', 'ЕРБ',
+)
+
+# Размеры выгрузок по умолчанию
+SIZES = {'100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+PAYMENT_STATUSES = ('Оплачен', 'Возвращен', 'Не оплачен')
+PAYMENT_WEIGHTS = (85, 9, 6)
+FIRST_DAY = date(2021, 1, 1)
+DAYS = 4 * 365
+# Строк, для которых случайные значения выбираются одним вызовом
+CHUNK_SIZE = 10_000
+
+def parse_size(value):
+    """Число строк: 100k, 1m, 10m или целое число"""
+    value = value.lower().replace('_', '')
+    if value in SIZES:
+        return SIZES[value]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    try:
+        rows = int(value.rstrip('km')) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный размер: {value}")
+    if rows < 1:
+        raise argparse.ArgumentTypeError("Размер должен быть положительным")
+    return rows
+
+def zipf_weights(count, exponent=1.1):
+    """Накопленные веса распределения Ципфа для random.choices"""
+    total = 0.0
+    weights = []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+def _amount(value):
+    """Сумма в формате выгрузки: десятичная запятая"""
+    return f"{value:.2f}".replace('.', ',')
+
+def generate_rows(rows, seed=1):
+    """Строки выгрузки (списки значений в порядке CSV_HEADERS)"""
+    rng = random.Random(seed)
+    # Справочники растут с объемом выгрузки, но медленнее числа заказов
+    sellers = [f'Продавец {i}' for i in range(max(50, int(rows ** 0.5)))]
+    organizers = [f'Организатор {i}' for i in range(max(10, int(rows ** 0.5) // 5))]
+    events = [f'Событие {i}' for i in range(max(100, rows // 200))]
+    seller_weights = zipf_weights(len(sellers))
+    organizer_weights = zipf_weights(len(organizers))
+    event_weights = zipf_weights(len(events), exponent=0.9)
+
+    for start in range(0, rows, CHUNK_SIZE):
+        count = min(CHUNK_SIZE, rows - start)
+        chunk_sellers = rng.choices(sellers, cum_weights=seller_weights, k=count)
+        chunk_organizers = rng.choices(organizers, cum_weights=organizer_weights, k=count)
+        chunk_events = rng.choices(events, cum_weights=event_weights, k=count)
+        chunk_statuses = rng.choices(PAYMENT_STATUSES, weights=PAYMENT_WEIGHTS, k=count)
+        for offset in range(count):
+            number = start + offset
+            organizer = chunk_organizers[offset]
+            # Каждая десятая продажа — прямая продажа организатора
+            seller = organizer if rng.random() < 0.1 else chunk_sellers[offset]
+            status = chunk_statuses[offset]
+            tickets = rng.choice((1, 1, 1, 2, 2, 3, 4))
+            order_amount = tickets * rng.randint(5, 120) * 100
+            order_day = FIRST_DAY + timedelta(days=rng.randrange(DAYS))
+            event_day = order_day + timedelta(days=rng.randrange(90))
+
+            if seller == organizer:
+                agent_percent = -1
+                agent_amount = 0
+            else:
+                agent_percent = rng.choice((5, 7, 10, 12))
+                # Часть заказов остается без начисленного вознаграждения
+                agent_amount = 0 if rng.random() < 0.03 else order_amount * agent_percent / 100
+            system_amount = order_amount * 0.05
+            if status == 'Возвращен':
+                refund_amount = order_amount if rng.random() < 0.6 else order_amount / 2
+                refund_date = (order_day + timedelta(days=rng.randrange(30))).isoformat()
+            else:
+                refund_amount = 0
+                refund_date = ''
+
+            yield [
+                f'B{number:09d}',
+                order_day.isoformat(),
+                f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+                f'Клиент {rng.randrange(rows)}',
+                f'client{number}@example.com',
+                f'+7900{number % 10_000_000:07d}',
+                chunk_events[offset],
+                event_day.isoformat(),
+                f'{rng.choice((10, 12, 14, 16, 18, 19, 20, 21)):02d}:00',
+                organizer,
+                seller,
+                tickets,
+                _amount(order_amount),
+                'PROMO' if rng.random() < 0.05 else '',
+                0,
+                agent_percent,
+                5,
+                _amount(order_amount - agent_amount - system_amount),
+                _amount(agent_amount),
+                _amount(system_amount),
+                0,
+                status,
+                'Аннулирован' if status == 'Возвращен' else 'Активен',
+                refund_date,
+                _amount(refund_amount),
+                0,
+            ]
+
+def write_csv(path, rows, seed=1):
+    """Запись выгрузки в файл; возвращает путь"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';', quotechar='"')
+        writer.writerow(CSV_HEADERS)
+        writer.writerows(generate_rows(rows, seed))
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетической выгрузки заказов")
+    parser.add_argument('size', type=parse_size, help="Число строк: 100k, 1m, 10m или число")
+    parser.add_argument('output', type=Path, help="Путь к CSV файлу")
+    parser.add_argument('--seed', type=int, default=1, help="Начальное значение генератора")
+    args = parser.parse_args(argv)
+    write_csv(args.output, args.size, args.seed)
+    print(f"Записано строк: {args.size} в {args.output}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Прогон замеров: импорт синтетической выгрузки и все эндпоинты приложения.
+
+Импорт запускается отдельным процессом (data/import_data.py --bulk), затем
+поверх загруженной базы импортируется дельта из 1% измененных заказов.
+Эндпоинты опрашиваются тестовым клиентом Flask с отключенным кэшем ответов
+(CACHE_TYPE=NullCache): замеряется путь запроса к базе, а не чтение кэша.
+Список эндпоинтов берется из app.url_map, поэтому новые маршруты попадают
+в замеры автоматически; параметры маршрутов, которым они нужны, — в
+_route_params.
+
+С --snapshots импорт публикует снимок базы (models.snapshot), и эндпоинты
+читают его, а не рабочую базу.
+
+Результат — JSON с медианой (p50) и 95-м перцентилем (p95) задержки и пиком
+памяти Python на каждый эндпоинт; два результата сравнивает bench.compare.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.generate import parse_size, write_csv
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMPORT_SCRIPT = BASE_DIR / 'data' / 'import_data.py'
+
+def _run_process(command):
+    """Запуск процесса; возвращает пик памяти (МБ) его и его дочерних процессов.
+
+    Пик известен только там, где есть os.wait4 (не в Windows), иначе None.
+    """
+    process = subprocess.Popen(command, cwd=BASE_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not hasattr(os, 'wait4'):
+        returncode, peak_rss_mb = process.wait(), None
+    else:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss в Linux — в КБ
+        peak_rss_mb = round(usage.ru_maxrss / 1024, 1)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return peak_rss_mb
+
+def time_import(csv_path, db_path, bulk, workers, batch_size):
+    """Импорт файла отдельным процессом: время и пик памяти процесса"""
+    command = [sys.executable, str(IMPORT_SCRIPT), str(csv_path), '--db', str(db_path),
+               '--workers', str(workers), '--batch-size', str(batch_size)]
+    if bulk:
+        command.append('--bulk')
+    started = time.perf_counter()
+    peak_rss_mb = _run_process(command)
+    return {'seconds': round(time.perf_counter() - started, 3), 'peak_rss_mb': peak_rss_mb}
+
+def _route_params(seller, year, status):
+    """Параметры маршрутов, которые без них не работают"""
+    return {
+        '/seller': {'name': seller},
+        '/seller-events-filter': {'seller': seller, 'year': year},
+        '/api/seller-trend': {'seller': seller},
+        '/api/seller-stats': {'seller': seller},
+        '/api/seller-events': {'seller': seller},
+        '/api/export': {'format': 'csv', 'year': year, 'status': status},
+    }
+
+# Панели дашборда дополнительно замеряются с фильтрами года и статуса
+FILTERED_ROUTES = ('/api/dashboard', '/api/summary', '/api/top-sellers',
+                   '/api/booking-segments', '/api/flight-segments', '/api/time-segments')
+
+def endpoint_cases(app):
+    """Запросы для замеров: (название, метод, путь, параметры, JSON-тело)"""
+    from models.queries import get_statuses, get_top_sellers, get_years
+
+    with app.app_context():
+        sellers = [row['seller'] for row in get_top_sellers()]
+        year = get_years()[0]
+        status = get_statuses()[0]
+    params = _route_params(sellers[0], year, status)
+
+    cases = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == 'static':
+            continue
+        if 'POST' in rule.methods:
+            # Единственный POST-маршрут — сравнение продавцов
+            cases.append((rule.rule, 'POST', rule.rule, {}, {'sellers': sellers[:5]}))
+            continue
+        cases.append((rule.rule, 'GET', rule.rule, params.get(rule.rule, {}), None))
+        if rule.rule in FILTERED_ROUTES:
+            cases.append((f"{rule.rule}?year&status", 'GET', rule.rule,
+                          {'year': year, 'status': status}, None))
+    return cases
+
+def _percentile(timings, percent):
+    return statistics.quantiles(timings, n=100, method='inclusive')[percent - 1]
+
+def measure(client, method, path, params, body, repeat):
+    """Задержки запроса (мс) и пик памяти Python (КБ) за один запрос"""
+    def request():
+        response = client.open(path, method=method, query_string=params, json=body)
+        response.get_data()  # потоковые ответы читаются целиком
+        return response.status_code
+
+    status = request()  # первый запрос открывает соединения и прогревает кэш SQLite
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    request()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'status': status,
+        'p50_ms': round(_percentile(timings, 50), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+def benchmark_endpoints(db_path, repeat):
+    """Замеры всех эндпоинтов на базе db_path"""
+    # Настройки читаются при импорте config, поэтому задаются до импорта app
+    os.environ['DATABASE_PATH'] = str(db_path)
+    os.environ['CACHE_TYPE'] = 'NullCache'
+    os.environ['CACHE_WARMUP'] = '0'
+    os.environ['SLOW_QUERY_LOG'] = str(Path(db_path).parent / 'slow_queries.log')
+    from app import app
+
+    client = app.test_client()
+    results = {}
+    for name, method, path, params, body in endpoint_cases(app):
+        results[name] = measure(client, method, path, params, body, repeat)
+        print(f"{name}: p50 {results[name]['p50_ms']} мс, p95 {results[name]['p95_ms']} мс")
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(rows, workdir, repeat=20, workers=1, batch_size=2000, seed=1, snapshots=False):
+    """Полный прогон; возвращает словарь результатов"""
+    workdir = Path(workdir)
+    # Папку снимков читают и процесс импорта, и приложение
+    os.environ['DATABASE_SNAPSHOT_DIR'] = str(workdir / 'snapshots') if snapshots else ''
+    csv_path = write_csv(workdir / f'bench-{rows}.csv', rows, seed)
+    delta_path = write_csv(workdir / f'bench-{rows}-delta.csv', max(rows // 100, 1), seed + 1)
+    db_path = workdir / 'bench.db'
+    for suffix in ('', '-wal', '-shm'):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    for snapshot in (workdir / 'snapshots').glob('*'):
+        snapshot.unlink()
+
+    print(f"Импорт {rows} строк...")
+    bulk = time_import(csv_path, db_path, True, workers, batch_size)
+    bulk['rows_per_second'] = round(rows / bulk['seconds'])
+    delta = time_import(delta_path, db_path, False, workers, batch_size)
+    db_size_mb = round(db_path.stat().st_size / 1024 / 1024, 1)
+
+    return {
+        'meta': {
+            'rows': rows,
+            'repeat': repeat,
+            'seed': seed,
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'analytics_engine': os.getenv('ANALYTICS_ENGINE', 'sql'),
+            'snapshots': snapshots,
+        },
+        'import': {'bulk': bulk, 'delta': delta, 'db_size_mb': db_size_mb},
+        'endpoints': benchmark_endpoints(db_path, repeat),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры импорта и API на синтетических данных")
+    parser.add_argument('--rows', type=parse_size, default=parse_size('100k'),
+                        help="Размер выгрузки: 100k, 1m, 10m или число строк")
+    parser.add_argument('--output', type=Path, default=Path('bench-results.json'),
+                        help="Файл результатов JSON")
+    parser.add_argument('--workdir', type=Path,
+                        help="Папка для CSV и базы (по умолчанию временная)")
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="Повторов каждого запроса")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Процессов разбора строк при импорте")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--snapshots', action='store_true',
+                        help="Читать опубликованный снимок базы (DATABASE_SNAPSHOT_DIR)")
+    args = parser.parse_args(argv)
+    if args.repeat < 2:
+        parser.error("--repeat должен быть не меньше 2")
+
+    if args.workdir:
+        args.workdir.mkdir(parents=True, exist_ok=True)
+        results = run(args.rows, args.workdir, args.repeat, args.workers, seed=args.seed,
+                      snapshots=args.snapshots)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+            results = run(args.rows, workdir, args.repeat, args.workers, seed=args.seed,
+                          snapshots=args.snapshots)
+
+    args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"Результаты записаны в {args.output}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,45 @@
 import os
 from pathlib import Path
 
-BASE_DIR = Path(__file__).parent.parent
+BASE_DIR = Path(__file__).resolve().parent
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{BASE_DIR / 'data' / 'tickets.db'}"
+    DATABASE_PATH = os.getenv('DATABASE_PATH', str(BASE_DIR / 'data' / 'tickets.db'))
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    CACHE_TYPE = 'SimpleCache'
-    CACHE_DEFAULT_TIMEOUT = 300
\ No newline at end of file
+    # Файловый кэш общий для всех воркеров; ключи содержат версию данных,
+    # поэтому после импорта кэш устаревает сразу, а не по таймауту
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'FileSystemCache')
+    CACHE_DIR = os.getenv('CACHE_DIR', str(BASE_DIR / 'instance' / 'cache'))
+    CACHE_THRESHOLD = 5000
+    # Версия сборки в ETag и ключах кэша (models.responses.build_version);
+    # по умолчанию — хэш кода приложения, шаблонов и статики
+    APP_VERSION = os.getenv('APP_VERSION', '')
+    CACHE_DEFAULT_TIMEOUT = 86400
+    # Фоновый прогрев кэша для новой версии данных (models.warmup)
+    CACHE_WARMUP = os.getenv('CACHE_WARMUP', '1') == '1'
+    CACHE_WARMUP_WORKERS = 2  # одновременных запросов прогрева
+    CACHE_WARMUP_SELLERS = 10  # страниц первых продавцов рейтинга
+    CACHE_WARMUP_CHECK_INTERVAL = 5  # секунд между проверками версии данных
+    # Движок агрегатов дашборда: 'sql' или 'columnar' (models.analytics, pandas/numpy)
+    ANALYTICS_ENGINE = os.getenv('ANALYTICS_ENGINE', 'sql')
+    # Настройки соединений SQLite веб-приложения
+    SQLITE_BUSY_TIMEOUT = 5000  # мс
+    SQLITE_CACHE_SIZE = -65536  # 64MB на соединение
+    SQLITE_MMAP_SIZE = 268435456  # 256MB
+    # Опубликованные снимки базы (models.snapshot): папка снимков, из которых
+    # читает веб-приложение; пусто — чтение напрямую из DATABASE_PATH
+    DATABASE_SNAPSHOT_DIR = os.getenv('DATABASE_SNAPSHOT_DIR', '')
+    SNAPSHOT_MMAP_SIZE = int(os.getenv('SNAPSHOT_MMAP_SIZE', 1073741824))  # 1GB
+    # Потоков (и соединений только для чтения) в пуле параллельных запросов
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+    # Профилирование запросов (models.profiling): порог и журнал медленных
+    # запросов, доля запросов, для которых записывается план выполнения
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', str(BASE_DIR / 'instance' / 'slow_queries.log'))
+    QUERY_PLAN_SAMPLE_RATE = float(os.getenv('QUERY_PLAN_SAMPLE_RATE', 0.01))
+    # Сжатие ответов (models.responses): brotli, если установлен, иначе gzip
+    COMPRESS_MIN_SIZE = 500  # байт; ответы меньше отдаются без сжатия
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
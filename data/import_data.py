@@ -1,10 +1,31 @@
 import csv
+import codecs
 import sqlite3
 import hashlib
 from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm
 import os
+import sys
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from models.schema import (
+    TICKET_COLUMNS, FACT_COLUMNS, DIMENSION_COLUMNS, DIMENSION_TABLES, DERIVED_COLUMNS,
+    derived_values, create_tables, create_indexes, drop_indexes, ensure_statistics, bump_data_version,
+    set_bulk_load,
+)
+from models.rollup import (
+    MAX_SQL_PARAMS, ensure_rollup, rebuild_rollup, apply_orders, prune_rollup, refresh_seller_summary,
+    analyze_rollup,
+)
+from models.snapshot import ensure_snapshot
+from config import Config
 
 def parse_number(value):
     """Конвертация строковых чисел в float с улучшенной обработкой ошибок"""
@@ -68,26 +89,225 @@ def process_row(row):
         print(f"Ошибка обработки строки: {e}")
         return None
 
-def insert_batch(conn, batch):
-    """Пакетная вставка данных с обработкой ошибок"""
+def read_lines(f, pbar=None):
+    """Построчное чтение бинарного файла с декодированием и учетом прочитанных байт"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for raw in f:
+        if pbar is not None:
+            pbar.update(len(raw))
+        yield decoder.decode(raw)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def read_chunks(reader, size):
+    """Разбиение потока строк CSV на пакеты фиксированного размера"""
+    chunk = []
+    for row in reader:
+        if not row:
+            continue
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Заголовки CSV в процессе-обработчике (задаются инициализатором пула)
+_fieldnames = None
+
+def _init_worker(fieldnames):
+    global _fieldnames
+    _fieldnames = fieldnames
+
+def process_chunk(rows, fieldnames=None):
+    """Преобразование пакета сырых строк CSV в кортежи для вставки"""
+    fieldnames = fieldnames or _fieldnames
+    processed = []
+    for values in rows:
+        result = process_row(dict(zip(fieldnames, values)))
+        if result:
+            processed.append(result)
+    return processed
+
+def parse_chunks(chunks, fieldnames, workers=1):
+    """Параллельный разбор пакетов с сохранением исходного порядка.
+
+    Число пакетов в обработке ограничено, чтобы чтение файла не обгоняло
+    запись и потребление памяти оставалось постоянным.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield process_chunk(chunk, fieldnames)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(fieldnames,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(process_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def begin_bulk_load(conn):
+    """Подготовка пустой базы к массовой загрузке"""
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")  # 256MB cache
+    conn.execute("PRAGMA temp_store = MEMORY")
+    drop_indexes(conn)
+    set_bulk_load(conn, True)
+    conn.commit()
+    # Блокировка записи удерживается до конца загрузки: по ней веб-приложение
+    # отличает идущую загрузку от отметки прерванной (database.maintain_db)
+    conn.execute("BEGIN IMMEDIATE")
+
+def finish_bulk_load(conn, analyze=True):
+    """Построение индексов и сбор статистики после массовой загрузки"""
+    create_indexes(conn)
+    if analyze:
+        conn.execute("ANALYZE")
+    set_bulk_load(conn, False)
+    conn.commit()
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+# Колонки, записываемые импортером: факты и производные флаги
+UPSERT_COLUMNS = FACT_COLUMNS + tuple(DERIVED_COLUMNS)
+
+# Вставка нового заказа или обновление существующего (например, при возврате)
+UPSERT_TICKET_SQL = f'''
+INSERT INTO ticket_facts ({', '.join(UPSERT_COLUMNS)})
+VALUES ({', '.join('?' * len(UPSERT_COLUMNS))})
+ON CONFLICT(order_id) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in UPSERT_COLUMNS[1:])}
+'''
+
+# Позиции колонок-справочников в строке process_row
+DIMENSION_POSITIONS = tuple(
+    (TICKET_COLUMNS.index(column), table) for column, (_, table) in DIMENSION_COLUMNS.items()
+)
+
+def load_dimensions(conn):
+    """Идентификаторы значений справочников: {справочник: {название: id}}"""
+    return {
+        table: dict(conn.execute(f'SELECT name, id FROM {table}').fetchall())
+        for table in DIMENSION_TABLES
+    }
+
+def fact_row(conn, dimensions, row):
+    """Строка ticket_facts: названия заменяются id справочников,
+    новые значения добавляются в справочник; в конце — производные колонки"""
+    values = list(row)
+    for position, table in DIMENSION_POSITIONS:
+        name = values[position]
+        if name is None:
+            continue
+        ids = dimensions[table]
+        if name not in ids:
+            ids[name] = conn.execute(f'INSERT INTO {table} (name) VALUES (?)', (name,)).lastrowid
+        values[position] = ids[name]
+    values.extend(derived_values(row))
+    return values
+
+UPSERT_HASH_SQL = '''
+INSERT INTO import_hashes (scope, key, hash) VALUES (?, ?, ?)
+ON CONFLICT(scope, key) DO UPDATE SET
+    hash = excluded.hash,
+    updated_at = CURRENT_TIMESTAMP
+'''
+
+def row_hash(row):
+    """Хэш содержимого обработанной строки"""
+    return hashlib.sha1(repr(row).encode('utf-8')).hexdigest()
+
+def file_hash(path):
+    """Хэш содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fetch_row_hashes(conn, order_ids):
+    """Сохраненные хэши строк для указанных заказов"""
+    known = {}
+    for start in range(0, len(order_ids), MAX_SQL_PARAMS):
+        chunk = order_ids[start:start + MAX_SQL_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        known.update(conn.execute(f'''
+            SELECT key, hash FROM import_hashes
+            WHERE scope = 'row' AND key IN ({placeholders})
+        ''', chunk).fetchall())
+    return known
+
+def fetch_existing_orders(conn, order_ids):
+    """Заказы из order_ids, уже записанные в ticket_facts"""
+    existing = set()
+    for start in range(0, len(order_ids), MAX_SQL_PARAMS):
+        chunk = order_ids[start:start + MAX_SQL_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        existing.update(order_id for order_id, in conn.execute(
+            f'SELECT order_id FROM ticket_facts WHERE order_id IN ({placeholders})', chunk
+        ))
+    return existing
+
+def insert_batch(conn, batch, commit=True, rollup=True, dimensions=None):
+    """Пакетная запись новых и измененных заказов.
+
+    При rollup=True агрегаты seller_month_rollup обновляются в той же
+    транзакции. dimensions — кэш справочников из load_dimensions, общий
+    для всех пакетов импорта. Возвращает количество добавленных,
+    обновленных и пропущенных строк.
+    """
+    if dimensions is None:
+        dimensions = load_dimensions(conn)
     try:
+        # Последняя версия каждого заказа в пакете
+        latest = {}
+        for row in batch:
+            if row is not None:
+                latest[row[0]] = row
+
+        hashes = {order_id: row_hash(row) for order_id, row in latest.items()}
+        known = fetch_row_hashes(conn, list(latest))
+        changed = [order_id for order_id, digest in hashes.items() if known.get(order_id) != digest]
+        # Новыми считаются заказы, которых нет в ticket_facts: у заказов из
+        # перенесенной таблицы tickets хэшей строк еще нет
+        existing = fetch_existing_orders(conn, changed)
+
         cursor = conn.cursor()
         
-        # Вставляем данные о заказах
-        cursor.executemany('''
-        INSERT OR IGNORE INTO tickets VALUES (
-            NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        ''', [row for row in batch if row is not None])
+        # Вставляем или обновляем данные о заказах; вклад прежних версий
+        # заказов в агрегаты вычитается до обновления
+        if rollup:
+            apply_orders(conn, changed, sign=-1)
+        cursor.executemany(UPSERT_TICKET_SQL, [fact_row(conn, dimensions, latest[order_id]) for order_id in changed])
+        cursor.executemany(UPSERT_HASH_SQL, [('row', order_id, hashes[order_id]) for order_id in changed])
+        if rollup:
+            apply_orders(conn, changed)
         
-        conn.commit()
+        if commit:
+            conn.commit()
+
+        inserted = len(changed) - len(existing)
+        return inserted, len(changed) - inserted, len(latest) - len(changed)
     except Exception as e:
         conn.rollback()
         print(f"Ошибка при пакетной вставке: {e}")
         raise
 
-def import_csv_to_sqlite(csv_path=None, db_path=None, batch_size=1000):
-    """Основная функция импорта с улучшенной обработкой ошибок"""
+def import_csv_to_sqlite(csv_path=None, db_path=None, batch_size=1000, workers=1, bulk=False,
+                         force=False, snapshot_dir=None):
+    """Основная функция импорта с улучшенной обработкой ошибок.
+
+    Импорт инкрементальный: уже загруженный файл пропускается целиком
+    (если не указан force), а из нового файла записываются только новые
+    и изменившиеся заказы. С snapshot_dir после импорта публикуется снимок
+    базы для веб-приложения (models.snapshot).
+    """
     conn = None
     try:
         # Установка путей по умолчанию
@@ -95,7 +315,7 @@ def import_csv_to_sqlite(csv_path=None, db_path=None, batch_size=1000):
         if csv_path is None:
             csv_path = base_dir / 'data' / '2024-orders-export.csv'
         if db_path is None:
-            db_path = base_dir / 'data' / 'tickets.db'
+            db_path = Config.DATABASE_PATH
         
         # Проверка существования файлов
         if not Path(csv_path).exists():
@@ -109,87 +329,119 @@ def import_csv_to_sqlite(csv_path=None, db_path=None, batch_size=1000):
         conn.execute("PRAGMA journal_mode = WAL")
         conn.execute("PRAGMA synchronous = NORMAL")
         
-        # Создание таблицы
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id TEXT,
-            order_date TEXT,
-            order_time TEXT,
-            client_name TEXT,
-            client_email TEXT,
-            client_phone TEXT,
-            event_name TEXT,
-            event_date TEXT,
-            event_time TEXT,
-            organizer TEXT,
-            seller TEXT,
-            tickets_count INTEGER,
-            order_amount REAL,
-            discount_code TEXT,
-            discount_amount REAL,
-            agent_percent REAL,
-            system_percent REAL,
-            organizer_amount REAL,
-            agent_amount REAL,
-            system_amount REAL,
-            discount_value REAL,
-            payment_status TEXT,
-            ticket_status TEXT,
-            refund_date TEXT,
-            refund_amount REAL,
-            erb_amount REAL,
-            year INTEGER,
-            month INTEGER,
-            booking_hour INTEGER,
-            flight_hour INTEGER
-        )
-        ''')
+        # Создание таблиц (и перенос tickets прежней схемы в ticket_facts)
+        create_tables(conn)
+        ensure_rollup(conn)
+        conn.commit()
+
+        csv_hash = file_hash(csv_path)
+        if not force and conn.execute(
+            "SELECT 1 FROM import_hashes WHERE scope = 'file' AND hash = ?", (csv_hash,)
+        ).fetchone():
+            print(f"Файл уже импортирован: {csv_path}")
+            return
+
+        # Массовая загрузка возможна только в пустую таблицу
+        if bulk and conn.execute("SELECT 1 FROM ticket_facts LIMIT 1").fetchone():
+            print("Таблица ticket_facts не пуста, массовая загрузка отключена")
+            bulk = False
+
+        if bulk:
+            # Индексы строятся один раз после загрузки, все данные
+            # пишутся одной транзакцией
+            begin_bulk_load(conn)
+        else:
+            create_indexes(conn)
+            # Отметка прерванной массовой загрузки больше не нужна: индексы на месте
+            set_bulk_load(conn, False)
+            conn.commit()
         
-        # Чтение CSV файла
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f, delimiter=';', quotechar='"')
-            rows = list(reader)  # Читаем все строки для точного прогресс-бара
-            
-            with tqdm(total=len(rows), desc="Импорт данных") as pbar:
-                batch = []
-                
-                for row in rows:
-                    try:
-                        processed = process_row(row)
-                        if processed:
-                            batch.append(processed)
-                            
-                            if len(batch) >= batch_size:
-                                insert_batch(conn, batch)
-                                batch = []
-                                
-                    except Exception as e:
-                        print(f"\nОшибка обработки строки: {e}")
-                    
-                    pbar.update(1)
-                
-                # Вставка оставшихся данных
+        # Потоковое чтение CSV файла: строки не накапливаются в памяти,
+        # прогресс считается по прочитанным байтам. Разбор строк идет в пуле
+        # процессов, запись в SQLite выполняет только текущий процесс
+        with open(csv_path, 'rb') as f, \
+                tqdm(total=os.path.getsize(csv_path), desc="Импорт данных",
+                     unit='B', unit_scale=True, unit_divisor=1024) as pbar:
+            reader = csv.reader(read_lines(f, pbar), delimiter=';', quotechar='"')
+            fieldnames = next(reader, None)
+            if not fieldnames:
+                raise ValueError(f"CSV файл пуст: {csv_path}")
+
+            totals = [0, 0, 0]
+            dimensions = load_dimensions(conn)
+            for batch in parse_chunks(read_chunks(reader, batch_size), fieldnames, workers):
                 if batch:
-                    insert_batch(conn, batch)
+                    counts = insert_batch(conn, batch, commit=not bulk, rollup=not bulk,
+                                          dimensions=dimensions)
+                    totals = [total + count for total, count in zip(totals, counts)]
+
+        if bulk:
+            rebuild_rollup(conn)
+        else:
+            prune_rollup(conn)
+            ensure_statistics(conn)
+        # Итоги продавцов пересчитываются вместе с новой версией данных
+        refresh_seller_summary(conn)
+        if not bulk:
+            # После массовой загрузки статистику собирает finish_bulk_load
+            analyze_rollup(conn)
+        conn.execute(UPSERT_HASH_SQL, ('file', Path(csv_path).name, csv_hash))
+        # Новая версия данных сбрасывает кэш дашборда во всех воркерах
+        if totals[0] or totals[1]:
+            bump_data_version(conn)
+        conn.commit()
+        analyzed = bulk
+        if bulk:
+            finish_bulk_load(conn)
+            bulk = False
+        if snapshot_dir:
+            ensure_snapshot(conn, snapshot_dir, analyze=not analyzed)
         
         print("\nИмпорт успешно завершен")
+        print(f"Добавлено: {totals[0]}, обновлено: {totals[1]}, без изменений: {totals[2]}")
         
     except Exception as e:
         print(f"\nОшибка при импорте: {e}")
+        if conn and bulk:
+            # Восстанавливаем индексы после отката незавершенной загрузки
+            conn.rollback()
+            finish_bulk_load(conn, analyze=False)
         raise
     finally:
         if conn:
             conn.close()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт выгрузки заказов из CSV в SQLite")
+    parser.add_argument('csv_path', nargs='?', type=Path,
+                        help="Путь к CSV файлу (по умолчанию data/2024-orders-export.csv)")
+    parser.add_argument('--db', dest='db_path', type=Path,
+                        help="Путь к базе данных (по умолчанию DATABASE_PATH, как у веб-приложения)")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="Количество строк в одном пакете вставки")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество процессов для разбора строк")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Массовая загрузка в пустую базу: одна транзакция, "
+                             "индексы строятся после загрузки")
+    parser.add_argument('--force', action='store_true',
+                        help="Обработать файл, даже если он уже был импортирован")
+    parser.add_argument('--snapshot-dir', type=Path, default=Config.DATABASE_SNAPSHOT_DIR or None,
+                        help="Папка снимков базы для веб-приложения "
+                             "(по умолчанию DATABASE_SNAPSHOT_DIR, без нее снимок не публикуется)")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size должен быть положительным")
+    if args.workers < 1:
+        parser.error("--workers должен быть положительным")
+    return args
+
 if __name__ == '__main__':
+    args = parse_args()
     try:
-        # Запрос пути к CSV файлу, если не указан
-        csv_input = input("Введите путь к CSV файлу (или оставьте пустым для файла по умолчанию): ").strip()
-        csv_path = Path(csv_input) if csv_input else None
-        
-        import_csv_to_sqlite(csv_path)
-        
+        import_csv_to_sqlite(args.csv_path, args.db_path,
+                             batch_size=args.batch_size, workers=args.workers,
+                             bulk=args.bulk, force=args.force, snapshot_dir=args.snapshot_dir)
     except Exception as e:
         print(f"Критическая ошибка: {e}")
-        input("Нажмите Enter для выхода...")
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,14 @@
+"""Настройки gunicorn: gunicorn app:app
+
+Воркеры обслуживают запросы потоками (gthread): пока один поток ждет
+SQLite, остальные принимают запросы, поэтому пропускная способность растет
+без увеличения числа процессов. Соединения только для чтения открываются
+по одному на поток (models.database.get_db_connection).
+"""
+import os
+
+bind = os.getenv('BIND', '127.0.0.1:8000')
+workers = int(os.getenv('WEB_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+timeout = 120  # выгрузка больших файлов (/api/export) идет дольше обычного запроса
@@ -0,0 +1,165 @@
+"""Колоночный движок агрегатов дашборда.
+
+Таблица seller_month_rollup загружается в память процесса массивами NumPy:
+продавец, организатор, событие и статус оплаты хранятся целочисленными
+кодами, показатели — числовыми колонками. Панели дашборда считаются
+векторными суммами по маскам (np.bincount по коду продавца) вместо
+запросов к SQLite. Данные перезагружаются, когда импорт меняет версию
+данных. Движок включается настройкой ANALYTICS_ENGINE = 'columnar';
+без pandas/numpy или с другим значением настройки используется SQL.
+"""
+import threading
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # движок необязателен
+    np = pd = None
+
+from config import Config
+from models.database import get_db_connection, current_data_version
+from models.filters import build_filters
+# models.queries импортирует этот модуль, поэтому обращения к queries.*
+# выполняются только внутри функций
+from models import queries
+
+KEY_COLUMNS = ('year', 'month', 'agent_sign', 'percent_sign', 'full_refund')
+FLOAT_MEASURES = ('order_amount', 'agent_amount', 'system_amount', 'organizer_amount',
+                  'refund_amount', 'positive_refund_amount')
+INT_MEASURES = ('orders_count', 'tickets_count', 'refunds_count')
+
+# Загруженные массивы и версия данных, по которой они построены
+_state = {'version': None, 'data': None}
+_lock = threading.Lock()
+
+def is_enabled():
+    """Движок включен в настройках и зависимости установлены"""
+    return Config.ANALYTICS_ENGINE == 'columnar' and np is not None
+
+def load_rollup(conn):
+    """Колоночные массивы seller_month_rollup"""
+    frame = pd.read_sql_query(f'''
+        SELECT seller, organizer, event_name, payment_status,
+               {', '.join(KEY_COLUMNS + FLOAT_MEASURES + INT_MEASURES)}
+        FROM seller_month_rollup
+    ''', conn)
+
+    # Продавцы и организаторы кодируются общим словарем, чтобы
+    # условие seller = organizer сравнивало целые числа
+    names = pd.Categorical(pd.concat([frame['seller'], frame['organizer']]))
+    events = pd.Categorical(frame['event_name'])
+    statuses = pd.Categorical(frame['payment_status'])
+
+    data = {
+        'names': list(names.categories),
+        'seller': names.codes[:len(frame)],
+        'organizer': names.codes[len(frame):],
+        'events': list(events.categories),
+        'event': events.codes,
+        'statuses': list(statuses.categories),
+        'status': statuses.codes,
+    }
+    for column in KEY_COLUMNS + INT_MEASURES:
+        data[column] = frame[column].to_numpy(dtype=np.int64)
+    for column in FLOAT_MEASURES:
+        data[column] = frame[column].to_numpy(dtype=np.float64)
+    return data
+
+def current_data():
+    """Массивы текущей версии данных; перезагрузка после импорта"""
+    version = current_data_version()
+    with _lock:
+        if _state['data'] is None or _state['version'] != version:
+            conn = get_db_connection()
+            try:
+                _state['data'] = load_rollup(conn)
+            finally:
+                conn.close()
+            _state['version'] = version
+        return _state['data']
+
+def _status_mask(data, status):
+    """Маска строк со статусом оплаты (пустая для неизвестного статуса)"""
+    if status not in data['statuses']:
+        return np.zeros(len(data['status']), dtype=bool)
+    return data['status'] == data['statuses'].index(status)
+
+def _filter_mask(data, filters):
+    """Маска фильтров seller/year/month/status с проверкой значений как в SQL"""
+    _, params = build_filters(filters)
+    mask = np.ones(len(data['status']), dtype=bool)
+    if 'seller' in params:
+        names = data['names']
+        mask &= data['seller'] == (names.index(params['seller']) if params['seller'] in names else -1)
+    if 'year' in params:
+        mask &= data['year'] == params['year']
+    if 'month' in params:
+        mask &= data['month'] == params['month']
+    if 'status' in params:
+        mask &= _status_mask(data, params['status'])
+    return mask
+
+def _condition_masks(data):
+    """Маски условий показателей панелей (см. queries.PANELS)"""
+    returned = _status_mask(data, 'Возвращен')
+    paid = _status_mask(data, 'Оплачен')
+    no_agent = data['agent_sign'] == 0
+    self_sale = data['seller'] == data['organizer']
+    return {
+        None: np.ones(len(data['status']), dtype=bool),
+        queries.RETURNED: returned,
+        queries.UNREWARDED: no_agent & (data['percent_sign'] > 0) & paid,
+        queries.DIRECT_PAID: self_sale & (data['percent_sign'] < 0) & paid & no_agent,
+        queries.SELF_REFUND: returned & self_sale & (data['percent_sign'] < 0),
+    }
+
+def _panel_masks(data, filter_mask):
+    """Маски отбора строк панелей (см. queries.PANELS)"""
+    paid_or_returned = ~_status_mask(data, 'Не оплачен')
+    has_agent = data['agent_sign'] > 0
+    partial = data['full_refund'] == 0
+    return {
+        'summary': paid_or_returned & filter_mask,
+        'top_sellers': has_agent & filter_mask,
+        'direct_sales': ((data['agent_sign'] == 0) & (data['percent_sign'] < 0) & paid_or_returned
+                         & partial & (data['seller'] == data['organizer'])),
+        'all_agents': paid_or_returned & partial & has_agent,
+    }
+
+def seller_panel_rows(filters=None, panels=None):
+    """Строки продавцов каждой панели в формате queries.seller_panel_rows"""
+    data = current_data()
+    panels = panels or queries.PANELS
+    size = len(data['names'])
+    panel_masks = _panel_masks(data, _filter_mask(data, filters))
+    condition_masks = _condition_masks(data)
+
+    result = {}
+    for panel in panels:
+        panel_mask = panel_masks[panel]
+        groups = np.bincount(data['seller'][panel_mask], minlength=size)
+        columns = {}
+        for name, (column, extra) in queries.PANELS[panel][1].items():
+            mask = panel_mask & condition_masks[extra]
+            sums = np.bincount(data['seller'][mask], weights=data[column][mask], minlength=size)
+            if column in INT_MEASURES:
+                sums = np.rint(sums).astype(np.int64)
+            columns[name] = sums.tolist()
+
+        result[panel] = [
+            {'seller': data['names'][code], **{name: values[code] for name, values in columns.items()}}
+            for code in np.flatnonzero(groups).tolist()
+        ]
+    return result
+
+def sales_trend():
+    """Помесячные суммы агентского вознаграждения и комиссии системы"""
+    data = current_data()
+    periods, codes = np.unique(data['year'] * 100 + data['month'], return_inverse=True)
+    agent = np.bincount(codes, weights=data['agent_amount'], minlength=len(periods))
+    system = np.bincount(codes, weights=data['system_amount'], minlength=len(periods))
+    return [
+        {'month': f'{period // 100:04d}-{period % 100:02d}', 'agent_amount': agent_amount,
+         'system_amount': system_amount}
+        for period, agent_amount, system_amount in zip(periods.tolist(), agent.tolist(), system.tolist())
+    ]
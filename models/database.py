@@ -1,60 +1,176 @@
+import contextvars
+import os
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
+from models.schema import (
+    create_tables, create_indexes, ensure_statistics, get_data_version, is_bulk_load, set_bulk_load,
+)
+from models.rollup import ensure_rollup
+from models.profiling import ProfiledConnection
+from models.snapshot import current_snapshot, ensure_snapshot, open_snapshot
 
 db = SQLAlchemy()
 
-def get_db_connection():
-    conn = sqlite3.connect('data/tickets.db')
+# Соединения пула: по одному на поток каждого процесса
+_local = threading.local()
+
+class PooledConnection(ProfiledConnection):
+    """Соединение из пула потока.
+
+    close() не закрывает соединение, а возвращает его в пул (откатывая
+    незавершенную транзакцию), поэтому существующий код вида
+    conn = get_db_connection(); ...; conn.close() работает без изменений.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        super().close()
+
+def _current_snapshot():
+    if not Config.DATABASE_SNAPSHOT_DIR:
+        return None
+    return current_snapshot(Config.DATABASE_SNAPSHOT_DIR)
+
+def connect(db_path=None, readonly=False, factory=ProfiledConnection):
+    """Новое соединение с настроенными PRAGMA; запросы профилируются (models.profiling).
+
+    Соединение только для чтения без db_path открывает текущий снимок базы
+    (models.snapshot), если снимки включены и уже опубликованы.
+    """
+    snapshot = _current_snapshot() if readonly and db_path is None else None
+    if snapshot:
+        conn = open_snapshot(snapshot, factory=factory)
+    else:
+        conn = sqlite3.connect(db_path or Config.DATABASE_PATH, factory=factory)
+    conn.snapshot = snapshot
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {Config.SQLITE_BUSY_TIMEOUT}")
+    conn.execute(f"PRAGMA cache_size = {Config.SQLITE_CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size = {Config.SNAPSHOT_MMAP_SIZE if snapshot else Config.SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def get_db_connection():
+    """Соединение только для чтения, открытое один раз на поток"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid() and conn.snapshot != _current_snapshot():
+        # Опубликован новый снимок: соединение с прежним закрывается
+        conn.dispose()
+        conn = None
+    # После fork (gunicorn) соединение родителя использовать нельзя
+    if conn is None or _local.pid != os.getpid():
+        conn = connect(readonly=True, factory=PooledConnection)
+        _local.conn = conn
+        _local.pid = os.getpid()
     return conn
 
+# Пул потоков для запросов к БД: у каждого потока пула свое соединение
+# только для чтения (get_db_connection), число потоков ограничено DB_POOL_SIZE
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Потоки родителя после fork (gunicorn) не переходят в воркер
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=Config.DB_POOL_SIZE,
+                                           thread_name_prefix='db', initializer=_mark_pool_thread)
+            _executor_pid = os.getpid()
+        return _executor
+
+def _mark_pool_thread():
+    _local.in_pool = True
+
+def run_concurrently(*calls):
+    """Выполнение независимых функций без аргументов в пуле потоков БД.
+
+    Возвращает результаты в порядке calls, первая ошибка пробрасывается.
+    SQLite отпускает GIL на время запроса, поэтому запросы идут параллельно.
+    Функции видят контекст приложения и запроса вызывающего потока. Вызов
+    из потока пула выполняется последовательно, чтобы занятый пул не ждал
+    сам себя.
+    """
+    if len(calls) < 2 or getattr(_local, 'in_pool', False):
+        return [call() for call in calls]
+    executor = _get_executor()
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, call) for call in calls]
+    except RuntimeError:
+        # Пул закрыт при завершении интерпретатора (фоновый прогрев еще идет)
+        return [call() for call in calls]
+    return [future.result() for future in futures]
+
+def current_data_version():
+    """Версия данных, зафиксированная последним импортом"""
+    conn = get_db_connection()
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+def close_db_connection():
+    """Закрытие соединения пула текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.dispose()
+    _local.conn = None
+
+def _is_locked(error):
+    return str(error).startswith('database is locked')
+
+def maintain_db(conn):
+    """Схема, индексы, статистика и агрегаты рабочей базы; их же при каждом
+    запуске поддерживает импорт.
+
+    Пока импорт пишет, блокировка записи занята и вызов завершается ошибкой
+    database is locked. Возвращает False, если осталась отметка прерванной
+    массовой загрузки: она снимается, индексы строятся заново.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("BEGIN IMMEDIATE")
+
+    # Идущая массовая загрузка держит блокировку записи с момента отметки,
+    # поэтому отметка без блокировки осталась от прерванного импорта
+    stale = is_bulk_load(conn)
+    if stale:
+        set_bulk_load(conn, False)
+
+    # Создание таблиц и индексов
+    create_tables(conn)
+    create_indexes(conn)
+    ensure_statistics(conn)
+    ensure_rollup(conn)
+
+    conn.commit()
+    # Первый снимок или снимок для новой схемы публикуется при запуске
+    if Config.DATABASE_SNAPSHOT_DIR:
+        ensure_snapshot(conn, Config.DATABASE_SNAPSHOT_DIR)
+    return not stale
+
 def init_db(app):
+    """Обслуживание базы при запуске без ожидания записи: если базу держит
+    импорт, приложение запускается как есть — импорт обслужит базу сам"""
     with app.app_context():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Создание таблицы
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id TEXT,
-            order_date TEXT,
-            order_time TEXT,
-            client_name TEXT,
-            client_email TEXT,
-            client_phone TEXT,
-            event_name TEXT,
-            event_date TEXT,
-            event_time TEXT,
-            organizer TEXT,
-            seller TEXT,
-            tickets_count INTEGER,
-            order_amount REAL,
-            discount_code TEXT,
-            discount_amount REAL,
-            agent_percent REAL,
-            system_percent REAL,
-            organizer_amount REAL,
-            agent_amount REAL,
-            system_amount REAL,
-            discount_value REAL,
-            payment_status TEXT,
-            ticket_status TEXT,
-            refund_date TEXT,
-            refund_amount REAL,
-            erb_amount REAL,
-            year INTEGER,
-            month INTEGER,
-            booking_hour INTEGER,
-            flight_hour INTEGER
-        )
-        ''')
-        
-        # Создание индексов
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_seller ON tickets(seller)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_date ON tickets(order_date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_year ON tickets(year)')
-        
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        conn = connect()
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            if not maintain_db(conn):
+                app.logger.warning("Снята отметка прерванной массовой загрузки, индексы восстановлены")
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e):
+                raise
+            conn.rollback()
+            app.logger.warning("База занята импортом: обслуживание базы при запуске пропущено")
+        finally:
+            conn.close()
@@ -0,0 +1,141 @@
+"""Потоковая выгрузка заказов в CSV, Parquet и Arrow.
+
+Строки представления tickets читаются курсором SQLite пачками по
+EXPORT_BATCH_SIZE и сразу отдаются генератором ответа, поэтому память
+не зависит от размера выгрузки. Фильтры year, status и seller те же, что
+на дашборде (models.filters). Форматы parquet и arrow (поток Arrow IPC)
+требуют pyarrow; без него доступен только CSV.
+"""
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # форматы parquet/arrow необязательны
+    pa = pq = None
+
+from models.database import connect
+from models.filters import build_filters, where_clause
+from models.schema import TICKET_COLUMNS
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_COLUMNS = ('id',) + TICKET_COLUMNS
+
+# Формат -> (MIME-тип, расширение файла)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+def is_available(export_format):
+    """Формат поддерживается и его зависимости установлены"""
+    return export_format == 'csv' or (export_format in EXPORT_FORMATS and pa is not None)
+
+def export_query(filters=None):
+    """Запрос строк выгрузки. Без ORDER BY: строки идут в порядке индекса
+    фильтра, и SQLite не сортирует всю выборку во временном B-дереве"""
+    conditions, params = build_filters(filters, dimension_ids=True)
+    query = f"""
+    SELECT {', '.join(EXPORT_COLUMNS)}
+    FROM tickets
+    {where_clause(conditions)}
+    """
+    return query, params
+
+def _batches(filters):
+    """Пачки строк выгрузки; соединение отдельное от пула потока и
+    закрывается, даже если клиент прервал загрузку"""
+    query, params = export_query(filters)
+    conn = connect(readonly=True)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def stream_csv(filters=None):
+    """CSV с заголовком; BOM в начале, чтобы Excel распознал UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield '\ufeff' + buffer.getvalue()
+    for rows in _batches(filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+class _StreamSink(io.RawIOBase):
+    """Файл для записи pyarrow: накапливает записанные байты до выдачи
+    очередной части ответа и сообщает позицию от начала потока"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+# Тип колонки представления tickets -> тип Arrow; колонки справочников
+# объявлены в представлении без типа и выгружаются строками
+_ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64'}
+
+def _arrow_schema(conn):
+    declared = {row['name']: row['type'] for row in conn.execute('PRAGMA table_info(tickets)')}
+    return pa.schema([
+        (column, getattr(pa, _ARROW_TYPES.get(declared.get(column), 'string'))())
+        for column in EXPORT_COLUMNS
+    ])
+
+def stream_arrow(filters=None, export_format='parquet'):
+    """Parquet (пачка — группа строк) или поток Arrow IPC (пачка — RecordBatch)"""
+    conn = connect(readonly=True)
+    try:
+        schema = _arrow_schema(conn)
+    finally:
+        conn.close()
+
+    sink = _StreamSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in _batches(filters):
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_table(pa.Table.from_batches([batch]))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def stream_export(export_format, filters=None):
+    """Генератор частей ответа выгрузки в выбранном формате"""
+    if export_format == 'csv':
+        return stream_csv(filters)
+    return stream_arrow(filters, export_format)
@@ -0,0 +1,72 @@
+"""Построение условий WHERE по фильтрам дашборда.
+
+Год и месяц фильтруются по колонкам year/month, а не через
+strftime(order_date): предикат на «голой» колонке может использовать
+составные индексы (seller_id, year, month) и (year, month). Условия
+одинаково применимы к tickets и к seller_month_rollup.
+
+Для tickets продавец и статус фильтруются по id справочников
+(dimension_ids=True): id ищется подзапросом один раз, и условие
+seller_id = (...) использует индекс, а не сравнивает названия по строкам.
+"""
+
+# Условия по справочникам: фильтр -> условие над колонкой *_id
+DIMENSION_CONDITIONS = {
+    'seller': "seller_id = (SELECT id FROM dim_party WHERE name = :seller)",
+    'status': "payment_status_id = (SELECT id FROM dim_payment_status WHERE name = :status)",
+    # Флаг вычисляется при импорте (models.schema.DERIVED_COLUMNS)
+    'unpaid': "is_unpaid = 0",
+}
+
+def _is_set(value):
+    return value not in (None, '', 'all')
+
+def _parse_int(value, name, low, high):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Некорректное значение фильтра {name}: {value}")
+    if not low <= number <= high:
+        raise ValueError(f"Некорректное значение фильтра {name}: {value}")
+    return number
+
+def parse_year(value):
+    """Год из параметра запроса: int или None, если фильтр не задан"""
+    return _parse_int(value, 'year', 1900, 9999) if _is_set(value) else None
+
+def build_filters(filters=None, exclude_unpaid=False, dimension_ids=False):
+    """Условия и именованные параметры для фильтров seller, year, month, status.
+
+    Значения None, '' и 'all' означают отсутствие фильтра. При
+    dimension_ids=True продавец и статус сравниваются по id справочников.
+    """
+    filters = filters or {}
+    conditions = []
+    params = {}
+
+    if _is_set(filters.get('seller')):
+        conditions.append(DIMENSION_CONDITIONS['seller'] if dimension_ids else "seller = :seller")
+        params['seller'] = filters['seller']
+
+    if _is_set(filters.get('year')):
+        conditions.append("year = :year")
+        params['year'] = parse_year(filters['year'])
+
+    if _is_set(filters.get('month')):
+        conditions.append("month = :month")
+        params['month'] = _parse_int(filters['month'], 'month', 1, 12)
+
+    if exclude_unpaid:
+        conditions.append(DIMENSION_CONDITIONS['unpaid'] if dimension_ids
+                          else "payment_status != 'Не оплачен'")
+
+    if _is_set(filters.get('status')):
+        conditions.append(DIMENSION_CONDITIONS['status'] if dimension_ids
+                          else "payment_status = :status")
+        params['status'] = filters['status']
+
+    return conditions, params
+
+def where_clause(conditions):
+    """Сборка WHERE-части из списка условий"""
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
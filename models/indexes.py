@@ -0,0 +1,157 @@
+"""Управление индексами и проверка их использования запросами дашборда.
+
+Для каждого фильтруемого запроса по EXPLAIN QUERY PLAN проверяется, что
+SQLite ищет строки по ожидаемому индексу, а не сканирует таблицу целиком;
+для покрывающих индексов — что запрос читает только индекс. Запуск (код
+возврата 1, если какой-то запрос потерял индекс):
+
+    python -m models.indexes [путь к базе] [--apply] [--report]
+
+--apply приводит индексы к управляемому набору (models.schema.INDEXES)
+и обновляет статистику планировщика; --report печатает планы запросов
+и размеры индексов.
+"""
+import argparse
+import sqlite3
+import sys
+
+from config import Config
+from models.schema import INDEXES, create_indexes, ensure_statistics
+from models.queries import (
+    seller_trend_query, seller_stats_query, seller_events_query, hour_histogram_query,
+    seller_page_query, seller_comparison_query, seller_summary_query,
+)
+
+SAMPLE_FILTERS = {'seller': 'seller', 'year': '2024', 'status': 'Оплачен'}
+
+# Таблицы, полный просмотр которых считается потерей индекса
+SCANNED_TABLES = ('ticket_facts', 'seller_month_rollup')
+
+# Название проверки -> (запрос с параметрами, ожидаемый индекс, только индекс)
+PLAN_CHECKS = {
+    'seller-stats': (
+        seller_stats_query({'seller': SAMPLE_FILTERS['seller']}),
+        'idx_seller_paid_cover', True,
+    ),
+    'seller-stats-year': (
+        seller_stats_query({'seller': SAMPLE_FILTERS['seller'], 'year': SAMPLE_FILTERS['year'],
+                            'status': SAMPLE_FILTERS['status']}),
+        'idx_seller_paid_cover', True,
+    ),
+    'seller-events-year': (
+        seller_events_query({'seller': SAMPLE_FILTERS['seller'], 'year': SAMPLE_FILTERS['year']}),
+        'idx_seller_cover', True,
+    ),
+    'time-segments': (
+        hour_histogram_query({}),
+        'idx_year_status_hours', True,
+    ),
+    'time-segments-year': (
+        hour_histogram_query({'year': SAMPLE_FILTERS['year'], 'status': SAMPLE_FILTERS['status']}),
+        'idx_year_status_hours', True,
+    ),
+    'years': (
+        ('SELECT year FROM tickets GROUP BY year ORDER BY year DESC', {}),
+        'idx_year_month', True,
+    ),
+    'tickets-year-month': (
+        ('SELECT COUNT(*) FROM tickets WHERE year = :year AND month = :month',
+         {'year': 2024, 'month': 1}),
+        'idx_year_month', True,
+    ),
+    # Страница, динамика и сравнение продавцов читают seller_month_rollup,
+    # итоги продавца — seller_summary; панели дашборда намеренно считаются
+    # одним проходом по всей таблице агрегатов
+    'seller-trend': (
+        seller_trend_query({'seller': SAMPLE_FILTERS['seller']}),
+        'PRIMARY KEY', False,
+    ),
+    'seller-trend-year': (
+        seller_trend_query({'seller': SAMPLE_FILTERS['seller'], 'year': SAMPLE_FILTERS['year'],
+                            'status': SAMPLE_FILTERS['status']}),
+        'PRIMARY KEY', False,
+    ),
+    'seller-summary': (
+        seller_summary_query(SAMPLE_FILTERS['seller'], int(SAMPLE_FILTERS['year'])),
+        'PRIMARY KEY', False,
+    ),
+    'seller-page': (
+        seller_page_query(SAMPLE_FILTERS['seller']),
+        'PRIMARY KEY', False,
+    ),
+    'seller-compare': (
+        seller_comparison_query([SAMPLE_FILTERS['seller'], 'other']),
+        'PRIMARY KEY', False,
+    ),
+}
+
+def explain(conn, query, params=()):
+    """Строки плана выполнения запроса"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()]
+
+def uses_index(plan, index_name, covering=False):
+    """План использует индекс (при covering=True — только индекс)
+    и не просматривает таблицы целиком"""
+    full_scan = any(step == f'SCAN {table}' for step in plan for table in SCANNED_TABLES)
+    if index_name == 'PRIMARY KEY':
+        expected = 'USING PRIMARY KEY'
+    else:
+        expected = f"USING {'COVERING ' if covering else ''}INDEX {index_name}"
+    return not full_scan and any(expected in step for step in plan)
+
+def verify_query_plans(conn, checks=None):
+    """Список проверок, запросы которых не используют ожидаемый индекс"""
+    failures = []
+    for name, ((query, params), index_name, covering) in (checks or PLAN_CHECKS).items():
+        plan = explain(conn, query, params)
+        if not uses_index(plan, index_name, covering):
+            failures.append((name, index_name, plan))
+    return failures
+
+def index_sizes(conn):
+    """Размер индексов ticket_facts и seller_month_rollup в байтах по dbstat"""
+    return conn.execute(f'''
+        SELECT m.name, SUM(s.pgsize) AS size
+        FROM sqlite_master m JOIN dbstat s ON s.name = m.name
+        WHERE m.type = 'index' AND m.tbl_name IN ({', '.join('?' * len(SCANNED_TABLES))})
+        GROUP BY m.name
+        ORDER BY size DESC
+    ''', SCANNED_TABLES).fetchall()
+
+def print_report(conn):
+    """Планы выполнения проверяемых запросов и размеры индексов"""
+    for name, ((query, params), index_name, _) in PLAN_CHECKS.items():
+        print(f"{name} (ожидается {index_name}):")
+        for step in explain(conn, query, params):
+            print(f"    {step}")
+    print("Размер индексов:")
+    for name, size in index_sizes(conn):
+        managed = ' (управляемый)' if name in INDEXES else ''
+        print(f"    {name}: {size / 1024 / 1024:.1f} МБ{managed}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Управление индексами и проверка планов запросов")
+    parser.add_argument('db_path', nargs='?', default=Config.DATABASE_PATH,
+                        help="Путь к базе данных (по умолчанию DATABASE_PATH)")
+    parser.add_argument('--apply', action='store_true',
+                        help="Создать недостающие, пересоздать измененные и удалить устаревшие индексы")
+    parser.add_argument('--report', action='store_true',
+                        help="Вывести планы запросов и размеры индексов")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    conn = sqlite3.connect(args.db_path)
+    if args.apply:
+        create_indexes(conn)
+        ensure_statistics(conn)
+        conn.commit()
+    if args.report:
+        print_report(conn)
+    failures = verify_query_plans(conn)
+    conn.close()
+
+    for name, index_name, plan in failures:
+        print(f"{name}: ожидался индекс {index_name}, план: {'; '.join(plan)}")
+    print(f"Проверено запросов: {len(PLAN_CHECKS)}, без индекса: {len(failures)}")
+    sys.exit(1 if failures else 0)
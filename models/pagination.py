@@ -0,0 +1,133 @@
+"""Постраничная выдача списков с сортировкой и поиском.
+
+Страницы задаются курсором (keyset): курсор кодирует ключ сортировки
+последней строки страницы, следующая страница начинается со строк строго
+после него. В отличие от OFFSET страницы не сдвигаются и не дублируются,
+а ответ ограничен limit строк при любом размере списка. Порядок строк
+однозначен: при равных значениях поля сортировки строки упорядочиваются
+по названию (продавца, события).
+"""
+import base64
+import bisect
+import json
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+def encode_cursor(key):
+    """Курсор для передачи в параметре запроса"""
+    data = json.dumps(key, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Ключ сортировки из курсора"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(data)
+    except ValueError:
+        raise ValueError(f"Некорректный курсор: {cursor}")
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError(f"Некорректный курсор: {cursor}")
+    return tuple(key)
+
+def parse_page(args, sort_columns, default_sort):
+    """Параметры страницы из аргументов запроса: sort, order, search, after, limit"""
+    sort = args.get('sort') or default_sort
+    if sort not in sort_columns:
+        raise ValueError(f"Некорректное поле сортировки: {sort}")
+
+    order = args.get('order') or 'desc'
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Некорректный порядок сортировки: {order}")
+
+    try:
+        limit = int(args.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError(f"Некорректное значение limit: {args.get('limit')}")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit должен быть от 1 до {MAX_LIMIT}")
+
+    after = args.get('after')
+    return {
+        'sort': sort,
+        'order': order,
+        'search': (args.get('search') or '').strip(),
+        'after': decode_cursor(after) if after else None,
+        'limit': limit,
+    }
+
+def sort_rows(rows, name_key, sort, search=''):
+    """Строки списка в порядке возрастания ключа (значение поля, название)
+    и сами ключи; search — подстрока названия без учета регистра"""
+    if search:
+        needle = search.casefold()
+        rows = [row for row in rows if needle in row[name_key].casefold()]
+
+    # Две устойчивые сортировки по одному полю быстрее сортировки по кортежу
+    rows = sorted(rows, key=itemgetter(name_key))
+    rows.sort(key=itemgetter(sort))
+    return rows, [(row[sort], row[name_key]) for row in rows]
+
+def page_of(rows, keys, order='desc', after=None, limit=DEFAULT_LIMIT):
+    """Страница отсортированного списка (см. sort_rows)"""
+    descending = order == 'desc'
+    try:
+        # Граница страницы по курсору ищется двоичным поиском по ключам
+        if descending:
+            end = len(rows) if after is None else bisect.bisect_left(keys, tuple(after))
+            start = max(end - limit, 0)
+            items = rows[start:end][::-1]
+            more = start > 0
+            last = start
+        else:
+            start = 0 if after is None else bisect.bisect_right(keys, tuple(after))
+            items = rows[start:start + limit]
+            more = start + limit < len(rows)
+            last = start + limit - 1
+    except TypeError:
+        # Курсор получен при сортировке по другому полю
+        raise ValueError("Курсор не соответствует полю сортировки")
+
+    return {
+        'items': items,
+        'next': encode_cursor(list(keys[last])) if more else None,
+        'total': len(rows),
+    }
+
+def paginate(rows, name_key, sort, order='desc', search='', after=None, limit=DEFAULT_LIMIT):
+    """Страница списка: {'items': строки, 'next': курсор или None, 'total': число строк}.
+
+    search — подстрока названия без учета регистра, after — ключ из курсора
+    предыдущей страницы.
+    """
+    rows, keys = sort_rows(rows, name_key, sort, search)
+    return page_of(rows, keys, order, after, limit)
+
+# Отсортированные списки последних запросов: следующие страницы того же
+# списка не пересчитывают агрегаты и не сортируют строки заново
+SORTED_CACHE_SIZE = 64
+_sorted_cache = OrderedDict()
+_sorted_lock = threading.Lock()
+
+def paginate_cached(list_key, load_rows, name_key, sort, order='desc', search='', after=None,
+                    limit=DEFAULT_LIMIT):
+    """paginate по строкам load_rows(), отсортированным один раз на list_key.
+
+    list_key должен включать версию данных и фильтры списка: по нему
+    отсортированные строки переиспользуются между запросами страниц.
+    """
+    key = (list_key, name_key, sort, search)
+    with _sorted_lock:
+        cached = _sorted_cache.get(key)
+        if cached is not None:
+            _sorted_cache.move_to_end(key)
+    if cached is None:
+        cached = sort_rows(load_rows(), name_key, sort, search)
+        with _sorted_lock:
+            _sorted_cache[key] = cached
+            while len(_sorted_cache) > SORTED_CACHE_SIZE:
+                _sorted_cache.popitem(last=False)
+    return page_of(*cached, order, after, limit)
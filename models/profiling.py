@@ -0,0 +1,243 @@
+"""Профилирование запросов к SQLite и метрики запросов веб-приложения.
+
+Соединения models.database создаются с фабрикой ProfiledConnection: для
+каждого запроса замеряются время выполнения (вместе с чтением строк) и
+число строк. Запросы текущего HTTP-запроса собираются в список контекста
+(он общий и для потоков run_concurrently) и попадают в заголовок
+Server-Timing и гистограммы /api/_metrics. Запросы дольше SLOW_QUERY_MS
+пишутся в журнал медленных запросов вместе с планом выполнения; план
+также записывается для доли QUERY_PLAN_SAMPLE_RATE остальных запросов.
+
+Метрики хранятся в памяти процесса: у каждого воркера gunicorn свои.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import g, request
+
+from config import Config
+
+logger = logging.getLogger('ticket_analytics.queries')
+
+# Запросы текущего HTTP-запроса; None вне запроса (импорт, прогрев, выгрузка)
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+# Ключ WSGI environ служебных запросов (прогрев кэша): они не попадают
+# в метрики и Server-Timing
+UNPROFILED_ENVIRON = 'ticket_analytics.unprofiled'
+
+def _has_plan(sql):
+    """План имеет смысл только для выборок (не для PRAGMA и DDL)"""
+    return sql.lstrip()[:6].upper() in ('SELECT', 'WITH (', 'WITH')
+
+def _query_plan(conn, sql, params):
+    rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return '; '.join(row[3] for row in rows)
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, который суммирует время выполнения и чтения строк запроса"""
+
+    _query = None  # executemany/executescript не профилируются
+
+    def execute(self, sql, parameters=()):
+        self._query = {'sql': sql, 'seconds': 0.0, 'rows': 0, 'plan': None}
+        self._params = parameters
+        self._logged = False
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.append(self._query)
+
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._add(started, 0)
+        if (Config.QUERY_PLAN_SAMPLE_RATE and _has_plan(sql)
+                and random.random() < Config.QUERY_PLAN_SAMPLE_RATE):
+            self._query['plan'] = _query_plan(self.connection, sql, parameters)
+            logger.info("План запроса (выборка): %s | %s", ' '.join(sql.split()), self._query['plan'])
+        return self
+
+    def _add(self, started, rows, done=False):
+        """Учет шага запроса; done — результат прочитан (проверка на медленный запрос)"""
+        query = self._query
+        if query is None:
+            return
+        query['seconds'] += time.perf_counter() - started
+        query['rows'] += rows
+        if done and not self._logged and query['seconds'] * 1000 >= Config.SLOW_QUERY_MS:
+            # План строится в потоке запроса: соединение нельзя передать в другой поток
+            self._logged = True
+            if query['plan'] is None and _has_plan(query['sql']):
+                query['plan'] = _query_plan(self.connection, query['sql'], self._params)
+            observe_slow_query(query)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, row is not None, done=True)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._add(started, len(rows), done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, len(rows), done=True)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started, 0, done=True)
+            raise
+        self._add(started, 1)
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение, запросы которого выполняются профилирующим курсором"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+class Histogram:
+    """Гистограмма Prometheus с набором меток"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # метки -> [счетчики корзин, сумма, количество]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{_join(labels, _le(bound))}}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{_join(labels, _le("+Inf"))}}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _le(bound):
+    return f'le="{bound}"'
+
+def _join(*parts):
+    return ','.join(part for part in parts if part)
+
+# Границы корзин, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram('ticket_http_request_duration_seconds',
+                             'Время обработки HTTP-запроса', LATENCY_BUCKETS)
+QUERY_DURATION = Histogram('ticket_db_query_duration_seconds',
+                           'Время выполнения запроса к SQLite', LATENCY_BUCKETS)
+QUERY_ROWS = Histogram('ticket_db_query_rows', 'Строк в результате запроса к SQLite',
+                       (1, 10, 100, 1000, 10000, 100000))
+_slow_queries = [0]
+_slow_lock = threading.Lock()
+
+def observe_slow_query(query):
+    with _slow_lock:
+        _slow_queries[0] += 1
+    logger.warning("Медленный запрос %.1f мс, строк %d: %s | план: %s",
+                   query['seconds'] * 1000, query['rows'], ' '.join(query['sql'].split()),
+                   query['plan'])
+
+def start_request():
+    """Начало сбора запросов HTTP-запроса: (токен контекста, время начала)"""
+    return _request_queries.set([]), time.perf_counter()
+
+def finish_request(state, response, endpoint, method):
+    """Запись метрик запроса и заголовка Server-Timing"""
+    _, started = state
+    queries = _request_queries.get() or []
+    elapsed = time.perf_counter() - started
+
+    db_seconds = sum(query['seconds'] for query in queries)
+    for query in queries:
+        QUERY_DURATION.observe(query['seconds'], endpoint=endpoint)
+        QUERY_ROWS.observe(query['rows'], endpoint=endpoint)
+    REQUEST_DURATION.observe(elapsed, endpoint=endpoint, method=method,
+                             status=response.status_code)
+
+    timings = [f'db;desc="{len(queries)} queries";dur={db_seconds * 1000:.1f}']
+    if queries:
+        timings.append(f'db-max;dur={max(query["seconds"] for query in queries) * 1000:.1f}')
+    timings.append(f'total;dur={elapsed * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+def render_metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for histogram in (REQUEST_DURATION, QUERY_DURATION, QUERY_ROWS):
+        lines.extend(histogram.render())
+    lines += ['# HELP ticket_db_slow_queries_total Запросов дольше SLOW_QUERY_MS',
+              '# TYPE ticket_db_slow_queries_total counter',
+              f'ticket_db_slow_queries_total {_slow_queries[0]}']
+    return '\n'.join(lines) + '\n'
+
+def init_profiling(app):
+    """Server-Timing, метрики запросов и журнал медленных запросов приложения"""
+    if Config.SLOW_QUERY_LOG and not logger.handlers:
+        os.makedirs(os.path.dirname(Config.SLOW_QUERY_LOG) or '.', exist_ok=True)
+        handler = logging.FileHandler(Config.SLOW_QUERY_LOG, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def start_profiling():
+        if not request.environ.get(UNPROFILED_ENVIRON):
+            g.profiling = start_request()
+
+    @app.after_request
+    def finish_profiling(response):
+        if 'profiling' not in g:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        return finish_request(g.profiling, response, endpoint, request.method)
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        # Запросы после ответа (потоковая выгрузка) уже не относятся к запросу
+        state = g.pop('profiling', None)
+        if state is not None:
+            _request_queries.reset(state[0])
@@ -1,156 +1,629 @@
-import sqlite3
-from models.database import get_db_connection
-from datetime import datetime
-import json
+from models.database import get_db_connection, run_concurrently, current_data_version
+from models import analytics
+from models.filters import build_filters, parse_year, where_clause
+from models.pagination import paginate, paginate_cached
 
-def get_summary_stats(filters=None):
+# Выражения над seller_month_rollup. Признаки строк хранятся в ключе
+# агрегата: agent_sign/percent_sign — знаки agent_amount/agent_percent,
+# full_refund — признак refund_amount = order_amount.
+#
+# Панели дашборда по seller_month_rollup. Все панели, кроме динамики
+# продаж, группируются по продавцу, поэтому считаются одним проходом:
+# для каждой панели — свое условие отбора строк и набор условных сумм
+UNPAID_EXCLUDED = "payment_status != 'Не оплачен'"
+RETURNED = "payment_status = 'Возвращен'"
+UNREWARDED = "agent_sign = 0 AND percent_sign > 0 AND payment_status = 'Оплачен'"
+DIRECT_PAID = "organizer = seller AND percent_sign < 0 AND payment_status = 'Оплачен' AND agent_sign = 0"
+SELF_REFUND = "payment_status = 'Возвращен' AND organizer = seller AND percent_sign < 0"
+
+# Слагаемые выручки: заказы минус возвраты минус заказы без вознаграждения
+REVENUE_MEASURES = {
+    'order_amount': ('order_amount', None),
+    'returned_refund': ('refund_amount', RETURNED),
+    'unrewarded_amount': ('order_amount', UNREWARDED),
+}
+
+# Панель -> (условие отбора, {показатель: (колонка, доп. условие)});
+# условие {filters} заменяется фильтрами по году и статусу
+PANELS = {
+    'summary': (f"{UNPAID_EXCLUDED} AND {{filters}}", {
+        **REVENUE_MEASURES,
+        'agent_amount': ('agent_amount', None),
+        'system_amount': ('system_amount', None),
+        'tickets_count': ('tickets_count', None),
+        'returned_tickets': ('tickets_count', RETURNED),
+        'unrewarded_tickets': ('tickets_count', UNREWARDED),
+        'direct_tickets': ('tickets_count', DIRECT_PAID),
+        'orders_count': ('orders_count', None),
+        'self_refund': ('refund_amount', SELF_REFUND),
+        'positive_refund': ('positive_refund_amount', RETURNED),
+        'refunds_count': ('refunds_count', RETURNED),
+    }),
+    'top_sellers': ("agent_sign > 0 AND {filters}", {
+        'agent_amount': ('agent_amount', None),
+        'system_amount': ('system_amount', None),
+        'tickets_count': ('tickets_count', None),
+    }),
+    'direct_sales': (f"agent_sign = 0 AND percent_sign < 0 AND {UNPAID_EXCLUDED} AND full_refund = 0 AND seller = organizer", {
+        **REVENUE_MEASURES,
+        'organizer_amount': ('organizer_amount', None),
+        'system_amount': ('system_amount', None),
+        'tickets_count': ('tickets_count', None),
+    }),
+    'all_agents': (f"{UNPAID_EXCLUDED} AND full_refund = 0 AND agent_sign > 0", {
+        **REVENUE_MEASURES,
+        'agent_amount': ('agent_amount', None),
+        'system_amount': ('system_amount', None),
+        'orders_count': ('orders_count', None),
+        'tickets_count': ('tickets_count', None),
+    }),
+}
+
+def seller_panels_query(filters=None, panels=PANELS):
+    """Один запрос по rollup с условными суммами выбранных панелей по продавцам"""
+    conditions, params = build_filters(filters)
+    filter_sql = ' AND '.join(conditions) or '1'
+
+    columns = []
+    panel_conditions = []
+    for panel in panels:
+        condition, measures = PANELS[panel]
+        condition = condition.format(filters=filter_sql)
+        panel_conditions.append(f"({condition})")
+        columns.append(f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END) AS {panel}__groups")
+        for name, (column, extra) in measures.items():
+            when = f"{condition} AND {extra}" if extra else condition
+            columns.append(f"SUM(CASE WHEN {when} THEN {column} ELSE 0 END) AS {panel}__{name}")
+
+    query = f"""
+    SELECT seller, {', '.join(columns)}
+    FROM seller_month_rollup
+    WHERE {' OR '.join(panel_conditions)}
+    GROUP BY seller
+    """
+    return query, params
+
+# Размер панели лучших продавцов на главной странице
+TOP_SELLERS_LIMIT = 20
+
+def _revenue(values):
+    return values['order_amount'] - values['returned_refund'] - values['unrewarded_amount']
+
+def _summary_panel(rows):
+    totals = dict.fromkeys(PANELS['summary'][1], 0)
+    for row in rows:
+        for name in totals:
+            totals[name] += row[name]
+
+    revenue = _revenue(totals)
+    return {
+        'total_revenue': revenue,
+        'total_agent': totals['agent_amount'],
+        'total_commission': totals['system_amount'],
+        'total_orders': (totals['tickets_count'] - totals['returned_tickets']
+                         - totals['unrewarded_tickets'] - totals['direct_tickets']),
+        'avg_order': revenue / totals['orders_count'] if totals['orders_count'] else 0,
+        'total_refunds': totals['returned_refund'] - totals['self_refund'],
+        'avg_refund': totals['positive_refund'] / totals['refunds_count'] if totals['refunds_count'] else 0,
+    }
+
+def _top_sellers_panel(rows):
+    result = [{
+        'seller': row['seller'],
+        'agent_amount': row['agent_amount'],
+        'system_amount': row['system_amount'],
+        'orders_count': row['tickets_count'],
+    } for row in rows]
+    result.sort(key=lambda row: row['agent_amount'], reverse=True)
+    return result[:TOP_SELLERS_LIMIT]
+
+# Прямые продажи Организатор = Агент
+def _direct_sales_panel(rows):
+    result = [{
+        'seller': row['seller'],
+        'direct_sales': row['organizer_amount'],
+        'system_commission': row['system_amount'],
+        'orders_count': row['tickets_count'],
+        'total_revenue': _revenue(row),
+    } for row in rows]
+    result.sort(key=lambda row: row['direct_sales'], reverse=True)
+    return result
+
+def _all_agents_panel(rows):
+    result = [{
+        'seller': row['seller'],
+        'agent_amount': row['agent_amount'],
+        'system_amount': row['system_amount'],
+        'orders_count': row['orders_count'],
+        'tickets_count': row['tickets_count'],
+        'total_revenue': _revenue(row),
+    } for row in rows]
+    result.sort(key=lambda row: row['agent_amount'], reverse=True)
+    return result
+
+PANEL_BUILDERS = {
+    'summary': _summary_panel,
+    'top_sellers': _top_sellers_panel,
+    'direct_sales': _direct_sales_panel,
+    'all_agents': _all_agents_panel,
+}
+
+def seller_panel_rows(filters=None, panels=PANELS):
+    """Строки продавцов каждой панели: {панель: [{seller, показатели...}]}"""
     conn = get_db_connection()
     try:
-        base_condition = "payment_status != 'Не оплачен' AND system_percent = 0 AND system_amount = 0"
-        where_clause, params = build_where_clause(filters)
-
-        if year != 'all':
-            try:
-                year = int(year)
-                where_clause = f"WHERE year = {year}"
-            except ValueError:
-                return {"error": "Invalid year format"}, 400
-        
-        # Добавляем базовое условие исключения "Не оплачен и полный возврат"
-        if "WHERE" in where_clause:
-            where_clause = where_clause.replace("WHERE", f"WHERE {base_condition} AND")
-        else:
-            where_clause = f"WHERE {base_condition}"
-            
-        query = f"""
-        SELECT
-        SUM(order_amount) - SUM(CASE WHEN payment_status = 'Возвращен' AND refund_amount > 0 THEN refund_amount ELSE 0 END) AS total_revenue,
-        SUM(CASE WHEN refund_amount != order_amount THEN agent_amount ELSE 0 END) as total_agent,
-        SUM(CASE WHEN refund_amount != order_amount THEN system_amount ELSE 0 END) as total_commission,
-        SUM(CASE WHEN payment_status = 'Возвращен' AND refund_amount > 0 THEN refund_amount ELSE 0 END) as total_refunds,
-        AVG(CASE WHEN payment_status = 'Возвращен' AND refund_amount > 0 THEN refund_amount ELSE 0 END) as avg_refund
-        FROM tickets
-        {where_clause}
-        """
-        
-        # Добавляем фильтры (например, по дате или статусу)
-        where_clause, params = build_where_clause(filters)
-        query += where_clause
-        
-        result = conn.execute(query).fetchone()
+        query, params = seller_panels_query(filters, panels)
+        rows = conn.execute(query, params).fetchall()
+    finally:
         conn.close()
-        
-        return {
-            'total_revenue': result['total_revenue'] or 0,
-            'total_agent': result['total_agent'] or 0,
-            'total_commission': result['total_commission'] or 0,
-            'total_orders': result['total_orders'] or 0,
-            'avg_order': result['avg_order'] or 0,
-            'total_refunds': result['total_refunds'] or 0,
-            'avg_refund': result['avg_refund'] or 0
-        }
-        
-    except sqlite3.Error as e:
-        return {"error": f"Database error: {str(e)}"}, 500
-    except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}, 500
 
-def get_top_sellers(limit=20):
+    panel_rows = {panel: [] for panel in panels}
+    for row in rows:
+        for panel in panels:
+            if row[f'{panel}__groups']:
+                panel_rows[panel].append({
+                    'seller': row['seller'],
+                    **{name: row[f'{panel}__{name}'] for name in PANELS[panel][1]},
+                })
+    return panel_rows
+
+def get_seller_panels(filters=None, panels=PANELS):
+    """Панели дашборда: один проход по rollup или колоночный движок"""
+    if analytics.is_enabled():
+        panel_rows = analytics.seller_panel_rows(filters, panels)
+    else:
+        panel_rows = seller_panel_rows(filters, panels)
+    return {panel: PANEL_BUILDERS[panel](panel_rows[panel]) for panel in panels}
+
+def get_summary_stats(filters=None):
+    return get_seller_panels(filters, ('summary',))['summary']
+
+def get_top_sellers(filters=None):
+    return get_seller_panels(filters, ('top_sellers',))['top_sellers']
+
+def get_direct_sales():
+    return get_seller_panels(panels=('direct_sales',))['direct_sales']
+
+def get_sales_trend():
+    if analytics.is_enabled():
+        return analytics.sales_trend()
+
     conn = get_db_connection()
+    try:
+        # Данные по месяцам
+        result = conn.execute('''
+            SELECT 
+                printf('%04d-%02d', year, month) as month,
+                SUM(agent_amount) as agent_amount,
+                SUM(system_amount) as system_amount
+            FROM seller_month_rollup
+            GROUP BY year, month
+            ORDER BY year, month
+        ''').fetchall()
+        return [dict(row) for row in result]
+    finally:
+        conn.close()
+
+def get_all_agents():
+    return get_seller_panels(panels=('all_agents',))['all_agents']
+
+def get_dashboard(filters=None):
+    """Все панели главной страницы: один проход по rollup для панелей
+    продавцов, динамика по месяцам и часовые распределения.
+
+    Три запроса независимы и выполняются параллельно в пуле потоков БД.
+    """
+    dashboard, sales_trend, (booking, flight) = run_concurrently(
+        lambda: get_seller_panels(filters),
+        get_sales_trend,
+        lambda: get_hour_histograms(filters),
+    )
+    # Рейтинг агентов отдается первой страницей, остальные — через /api/all-agents
+    agents = dashboard['all_agents']
+    dashboard['all_agents'] = paginate(agents, 'seller', 'agent_amount')
+    dashboard['agent_quartiles'] = agent_quartiles(agents)
+    dashboard['sales_trend'] = sales_trend
+    dashboard['segments'] = {
+        'booking': time_segments(booking),
+        'flight': time_segments(flight),
+    }
+    return dashboard
     
-    query = '''
+def seller_trend_query(filters):
+    """Запрос помесячной динамики агентского вознаграждения продавца"""
+    conditions, params = build_filters(filters)
+    query = f"""
     SELECT 
-        seller,
-        SUM(agent_amount) as agent_amount,
-        SUM(system_amount) as system_amount,
-        COUNT(*) as orders_count
-    FROM tickets
-    WHERE agent_amount > 0
-    GROUP BY seller
-    ORDER BY agent_amount DESC
-    LIMIT ?
-    '''
-    
-    result = conn.execute(query, (limit,)).fetchall()
-    conn.close()
-    
-    return [
-        dict(row) for row in result
-    ]
+        printf('%04d-%02d', year, month) as period,
+        SUM(agent_amount) as agent_amount
+    FROM seller_month_rollup
+    {where_clause(conditions)}
+    GROUP BY year, month
+    ORDER BY year, month
+    """
+    return query, params
 
-# Прямые продажи Организатор = Агент
-def get_direct_sales():
+def get_seller_trend(filters):
     conn = get_db_connection()
-    
-    query = '''
+    try:
+        query, params = seller_trend_query(filters)
+        result = conn.execute(query, params).fetchall()
+        return [dict(row) for row in result]
+    finally:
+        conn.close()
+
+def seller_stats_query(filters):
+    """Запрос итоговых показателей продавца.
+
+    Бизнес-правила выручки берутся из производных колонок, вычисленных
+    при импорте (см. models.schema.DERIVED_COLUMNS).
+    """
+    conditions, params = build_filters(filters, exclude_unpaid=True, dimension_ids=True)
+    query = f"""
     SELECT 
-        seller,
-        SUM(organizer_amount) as direct_sales,
-        SUM(system_amount) as system_commission,
-        SUM(tickets_count) as orders_count,
-        SUM(order_amount) - SUM(CASE WHEN payment_status = 'Возвращен' THEN refund_amount ELSE 0 END) - SUM(CASE WHEN agent_amount = 0 AND agent_percent > 0 AND payment_status = 'Оплачен' THEN order_amount ELSE 0 END) as total_revenue
+        SUM(net_revenue) AS total_revenue,
+        SUM(agent_amount) as total_agent,
+        SUM(system_amount) as total_commission,
+        SUM(tickets_count) 
+        - SUM(CASE WHEN is_refunded = 1 THEN tickets_count ELSE 0 END)
+        - SUM(CASE WHEN is_unrewarded = 1 THEN tickets_count ELSE 0 END)
+        - SUM(CASE WHEN is_direct_sale = 1 AND agent_amount = 0
+                        AND payment_status_id = (SELECT id FROM dim_payment_status WHERE name = 'Оплачен')
+                   THEN tickets_count ELSE 0 END)
+        AS total_orders,
+        CASE 
+            WHEN COUNT(*) > 0 THEN 
+                SUM(net_revenue) / 
+                COUNT(DISTINCT order_id)  -- Или COUNT(*) в зависимости от логики
+            ELSE 0 
+        END AS avg_order,
+        COALESCE(
+            SUM(CASE WHEN is_refunded = 1 THEN refund_amount ELSE 0 END)
+            - SUM(CASE WHEN is_refunded = 1 AND is_direct_sale = 1 THEN refund_amount ELSE 0 END)
+        , 0) as total_refunds
     FROM tickets
-    WHERE agent_amount = 0 AND agent_percent < 0 AND payment_status != 'Не оплачен' AND refund_amount != order_amount AND seller = organizer
-    GROUP BY seller
-    ORDER BY direct_sales DESC
-    '''
-    
-    result = conn.execute(query).fetchall()
-    conn.close()
-    
-    return [
-        dict(row) for row in result
-    ]
-    
-def get_seller_events(seller_name, year=None):
+    {where_clause(conditions)}
+    """
+    return query, params
+
+def seller_summary_query(seller, year=0):
+    """Итоги продавца из seller_summary (см. models.rollup); year = 0 — за все время"""
+    return "SELECT * FROM seller_summary WHERE seller = :seller AND year = :year", {
+        'seller': seller, 'year': year,
+    }
+
+def _seller_summary(seller, year=0):
     conn = get_db_connection()
     try:
-        where_conditions = ["seller = :seller"]
-        params = {'seller': seller_name}
-        
-        if year and year != 'all':
-            where_conditions.append("strftime('%Y', event_date) = :year")
-            params['year'] = year
-        
-        where_clause = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
-        
-        query = f"""
-        SELECT 
-            event_id,
-            event_name,
-            event_date,
-            tickets_sold,
-            total_revenue
-        FROM events
-        {where_clause}
-        ORDER BY event_date DESC
-        """
-        
+        query, params = seller_summary_query(seller, year)
+        return conn.execute(query, params).fetchone()
+    finally:
+        conn.close()
+
+def get_seller_stats(filters):
+    # Без фильтра по статусу итоги читаются из seller_summary по ключу
+    if filters.get('status') in (None, '', 'all'):
+        summary = _seller_summary(filters.get('seller'), parse_year(filters.get('year')) or 0)
+        if summary is not None and summary['orders']:
+            return {
+                'total_revenue': summary['revenue'],
+                'total_agent': summary['agent'],
+                'total_commission': summary['commission'],
+                'total_orders': summary['tickets'],
+                'avg_order': summary['revenue'] / summary['orders'],
+                'total_refunds': summary['refunds'],
+            }
+
+    conn = get_db_connection()
+    try:
+        query, params = seller_stats_query(filters)
+        return dict(conn.execute(query, params).fetchone())
+    finally:
+        conn.close()
+
+def seller_events_query(filters):
+    """Запрос списка событий продавца"""
+    conditions, params = build_filters(filters, dimension_ids=True)
+    query = f"""
+    SELECT DISTINCT event_name 
+    FROM tickets 
+    {where_clause(conditions)}
+    """
+    return query, params
+
+def get_seller_event_names(filters):
+    conn = get_db_connection()
+    try:
+        query, params = seller_events_query(filters)
+        return [row['event_name'] for row in conn.execute(query, params).fetchall()]
+    finally:
+        conn.close()
+
+def get_years():
+    conn = get_db_connection()
+    try:
+        years = conn.execute('''
+            SELECT year FROM tickets 
+            GROUP BY year
+            ORDER BY year DESC
+        ''').fetchall()
+        return [str(row['year']) for row in years]
+    finally:
+        conn.close()
+
+def get_seller_names():
+    """Продавцы из справочника dim_party, у которых есть заказы"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT name FROM dim_party
+            WHERE EXISTS (SELECT 1 FROM ticket_facts WHERE seller_id = dim_party.id)
+            ORDER BY name
+        ''').fetchall()
+        return [row['name'] for row in rows]
+    finally:
+        conn.close()
+
+def get_statuses():
+    """Статусы оплаты из справочника (кроме неоплаченных) в порядке появления"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT name FROM dim_payment_status
+            WHERE name NOT IN ('', 'Не оплачен')
+              AND EXISTS (SELECT 1 FROM ticket_facts WHERE payment_status_id = dim_payment_status.id)
+            ORDER BY id
+        ''').fetchall()
+        return [row['name'] for row in rows]
+    finally:
+        conn.close()
+
+def seller_page_query(seller):
+    """Агрегаты продавца по месяцам, событиям и статусам для страницы продавца"""
+    query = """
+    SELECT
+        year, month, event_name, payment_status, full_refund,
+        SUM(orders_count) AS orders_count,
+        SUM(tickets_count) AS tickets_count,
+        SUM(order_amount) AS order_amount,
+        SUM(CASE WHEN agent_sign = 0 AND percent_sign > 0 THEN order_amount ELSE 0 END) AS unrewarded_amount,
+        SUM(agent_amount) AS agent_amount,
+        SUM(system_amount) AS system_amount,
+        SUM(refund_amount) AS refund_amount,
+        SUM(refunds_count) AS refunds_count,
+        SUM(positive_refund_amount) AS positive_refund_amount
+    FROM seller_month_rollup
+    WHERE seller = :seller
+    GROUP BY year, month, event_name, payment_status, full_refund
+    """
+    return query, {'seller': seller}
+
+def _group_revenue(row):
+    """Выручка группы: заказы минус возвраты минус заказы без вознаграждения"""
+    revenue = row['order_amount']
+    if row['payment_status'] == 'Возвращен':
+        revenue -= row['refund_amount']
+    elif row['payment_status'] == 'Оплачен':
+        revenue -= row['unrewarded_amount']
+    return revenue
+
+def _seller_rollup_rows(seller):
+    conn = get_db_connection()
+    try:
+        query, params = seller_page_query(seller)
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+def _is_paid(row):
+    """Группа оплаченных заказов без полного возврата"""
+    return row['payment_status'] != 'Не оплачен' and not row['full_refund']
+
+def _seller_events(paid, year=None, events=()):
+    """Таблица событий продавца с фильтрами по году и списку событий"""
+    events = set(events)
+    events_by_name = {}
+    for row in paid:
+        if (year is not None and row['year'] != year) or (events and row['event_name'] not in events):
+            continue
+        event = events_by_name.setdefault(row['event_name'], {
+            'event_name': row['event_name'], 'year': row['year'], 'tickets_count': 0,
+            'order_amount': 0, 'agent_amount': 0, 'system_amount': 0,
+        })
+        event['year'] = max(event['year'], row['year'])
+        event['tickets_count'] += row['tickets_count']
+        event['order_amount'] += _group_revenue(row)
+        event['agent_amount'] += row['agent_amount']
+        event['system_amount'] += row['system_amount']
+    seller_events = sorted(events_by_name.values(), key=lambda event: event['agent_amount'], reverse=True)
+    for event in seller_events:
+        event['year'] = str(event['year'])
+    return seller_events
+
+# Поля сортировки таблиц с постраничной выдачей
+ALL_AGENTS_SORT = ('seller', 'agent_amount', 'system_amount', 'orders_count', 'tickets_count',
+                   'total_revenue')
+SELLER_EVENTS_SORT = ('event_name', 'tickets_count', 'agent_amount', 'system_amount', 'order_amount')
+
+def seller_page_loaders(seller):
+    """Независимые запросы страницы продавца: итоги из seller_summary и один
+    проход по rollup. Вызывающий выполняет их в одном run_concurrently
+    вместе со своими запросами и передает результаты в build_seller_page"""
+    return lambda: _seller_summary(seller), lambda: _seller_rollup_rows(seller)
+
+def get_seller_page(seller, year=None, events=()):
+    """Данные страницы продавца (см. build_seller_page)"""
+    summary, rows = run_concurrently(*seller_page_loaders(seller))
+    return build_seller_page(seller, summary, rows, year, events)
+
+def build_seller_page(seller, summary, rows, year=None, events=()):
+    """Данные страницы продавца по результатам seller_page_loaders.
+
+    Возвращает None, если у продавца нет оплаченных заказов. События
+    возвращаются первой страницей (см. get_seller_events_page).
+    """
+    if summary is None or not summary['paid_orders']:
+        return None
+
+    # Итоги и события считаются по оплаченным заказам без полного возврата
+    paid = [row for row in rows if _is_paid(row)]
+    stats = {
+        'seller': seller,
+        'total_revenue': summary['paid_revenue'],
+        'total_agent': summary['paid_agent'],
+        'total_commission': summary['paid_commission'],
+        'total_orders': summary['paid_tickets'],
+        'avg_order': summary['paid_revenue'] / summary['paid_orders'],
+        'total_refunds': summary['paid_refunds'],
+        'avg_refund': (summary['paid_positive_refunds'] / summary['paid_refunds_count']
+                       if summary['paid_refunds_count'] else None),
+    }
+
+    # Динамика агентского вознаграждения по всем заказам продавца
+    trend = {}
+    for row in rows:
+        period = f"{row['year']:04d}-{row['month']:02d}"
+        trend[period] = trend.get(period, 0) + row['agent_amount']
+
+    return {
+        'stats': stats,
+        'total_refunds': summary['returned_amount'],
+        'trend_labels': sorted(trend),
+        'trend_data': [trend[period] or 0 for period in sorted(trend)],
+        'seller_events': paginate(_seller_events(paid, year, events), 'event_name', 'agent_amount'),
+        'available_years': sorted({str(row['year']) for row in rows}, reverse=True),
+        'available_events': sorted({row['event_name'] for row in rows
+                                    if year is None or row['year'] == year}),
+    }
+
+def get_seller_events_page(seller, year=None, events=(), **page):
+    """Страница таблицы событий продавца (параметры page — см. pagination.paginate)"""
+    def load_events():
+        paid = [row for row in _seller_rollup_rows(seller) if _is_paid(row)]
+        return _seller_events(paid, year, events)
+
+    list_key = ('seller_events', current_data_version(), seller, year, tuple(sorted(set(events))))
+    return paginate_cached(list_key, load_events, 'event_name', **page)
+
+def get_all_agents_page(**page):
+    """Страница рейтинга всех агентов (параметры page — см. pagination.paginate)"""
+    return paginate_cached(('all_agents', current_data_version()), get_all_agents, 'seller', **page)
+
+def agent_quartiles(agents):
+    """Квартили агентского вознаграждения для подсветки сегментов рейтинга"""
+    amounts = sorted(agent['agent_amount'] for agent in agents)
+    if not amounts:
+        return []
+    return [amounts[int(len(amounts) * share)] for share in (0.25, 0.5, 0.75)]
+
+# Максимальное число продавцов в одном сравнении
+COMPARE_LIMIT = 50
+
+def seller_comparison_query(sellers):
+    """Помесячные показатели нескольких продавцов одним запросом"""
+    placeholders = ', '.join(f':seller{i}' for i in range(len(sellers)))
+    query = f"""
+    SELECT
+        seller, year, month,
+        SUM(order_amount)
+        - SUM(CASE WHEN payment_status = 'Возвращен' THEN refund_amount ELSE 0 END)
+        - SUM(CASE WHEN agent_sign = 0 AND percent_sign > 0 AND payment_status = 'Оплачен' THEN order_amount ELSE 0 END) AS revenue,
+        SUM(order_amount) AS order_amount,
+        SUM(agent_amount) AS agent,
+        SUM(system_amount) AS commission,
+        SUM(tickets_count) AS orders,
+        SUM(orders_count) AS orders_count
+    FROM seller_month_rollup
+    WHERE seller IN ({placeholders}) AND payment_status != 'Не оплачен' AND full_refund = 0
+    GROUP BY seller, year, month
+    ORDER BY seller, year, month
+    """
+    return query, {f'seller{i}': seller for i, seller in enumerate(sellers)}
+
+def get_seller_comparison(sellers):
+    """Итоги и помесячные ряды продавцов в порядке запроса.
+
+    Продавцы без оплаченных заказов в результат не попадают.
+    """
+    sellers = list(dict.fromkeys(sellers))
+    conn = get_db_connection()
+    try:
+        query, params = seller_comparison_query(sellers)
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    by_seller = {}
+    for row in rows:
+        item = by_seller.setdefault(row['seller'], {
+            'seller': row['seller'], 'revenue': 0, 'agent': 0, 'commission': 0,
+            'orders': 0, 'order_amount': 0, 'orders_count': 0, 'monthly': [],
+        })
+        for key in ('revenue', 'agent', 'commission', 'orders', 'order_amount', 'orders_count'):
+            item[key] += row[key]
+        item['monthly'].append({
+            'period': f"{row['year']:04d}-{row['month']:02d}",
+            'revenue': row['revenue'],
+            'agent': row['agent'],
+        })
+
+    result = []
+    for seller in sellers:
+        if seller in by_seller:
+            item = by_seller[seller]
+            item['avg_order'] = item.pop('order_amount') / item.pop('orders_count')
+            result.append(item)
+    return result
+
+# Сегменты суток: (название, цвет, условие на час)
+TIME_SEGMENTS = (
+    ("Утро (06:00-12:00)", "#FFA07A", lambda hour: 6 <= hour < 12),
+    ("День (12:00-18:00)", "#45B7D1", lambda hour: 12 <= hour < 18),
+    ("Вечер (18:00-00:00)", "#9966FF", lambda hour: hour >= 18 or hour < 6),
+)
+
+def hour_histogram_query(filters=None):
+    """Запрос числа заказов по паре (час оформления, час события)"""
+    conditions, params = build_filters(filters, dimension_ids=True)
+    query = f"""
+    SELECT booking_hour, flight_hour, COUNT(*) as orders
+    FROM tickets
+    {where_clause(conditions)}
+    GROUP BY booking_hour, flight_hour
+    """
+    return query, params
+
+def get_hour_histograms(filters=None):
+    """Распределение заказов по часу оформления и часу события за один проход"""
+    conn = get_db_connection()
+    try:
+        query, params = hour_histogram_query(filters)
         result = conn.execute(query, params).fetchall()
-        return [dict(row) for row in result]
+        
+        booking, flight = {}, {}
+        for row in result:
+            if row['booking_hour'] is not None:
+                booking[row['booking_hour']] = booking.get(row['booking_hour'], 0) + row['orders']
+            if row['flight_hour'] is not None:
+                flight[row['flight_hour']] = flight.get(row['flight_hour'], 0) + row['orders']
+        return booking, flight
     finally:
         conn.close()
 
-def create_indexes(conn):
-    """Создание всех необходимых индексов"""
-    indexes = [
-        "CREATE INDEX IF NOT EXISTS idx_seller ON tickets(seller)",
-        "CREATE INDEX IF NOT EXISTS idx_order_date ON tickets(order_date)",
-        "CREATE INDEX IF NOT EXISTS idx_payment_status ON tickets(payment_status)",
-        "CREATE INDEX IF NOT EXISTS idx_agent_amount ON tickets(agent_amount)",
-        "CREATE INDEX IF NOT EXISTS idx_system_amount ON tickets(system_amount)",
-        "CREATE INDEX IF NOT EXISTS idx_order_id ON tickets(order_id)",
-        "CREATE INDEX IF NOT EXISTS idx_import_hash ON import_hashes(hash)"
+def time_segments(histogram):
+    """Сегменты утро/день/вечер по почасовой гистограмме"""
+    values = [
+        sum(count for hour, count in histogram.items() if in_segment(hour))
+        for _, _, in_segment in TIME_SEGMENTS
     ]
+    total = sum(values)
     
-    for index_sql in indexes:
-        conn.execute(index_sql)
-    conn.commit()
-
-def optimize_database(conn):
-    """Оптимизация базы данных"""
-    conn.execute("PRAGMA journal_mode = WAL")
-    conn.execute("PRAGMA synchronous = NORMAL")
-    conn.execute("PRAGMA cache_size = -10000")  # 10MB cache
-    conn.execute("VACUUM")
-    conn.commit()
\ No newline at end of file
+    return {
+        "segments": [
+            {"name": name, "value": value,
+             "percent": round(value / total * 100, 1) if total else 0, "color": color}
+            for (name, color, _), value in zip(TIME_SEGMENTS, values)
+        ],
+        "hours": [histogram.get(hour, 0) for hour in range(24)],
+        "total": total
+    }
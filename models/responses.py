@@ -0,0 +1,133 @@
+"""Сериализация, сжатие и условные GET ответов веб-приложения.
+
+- FastJSONProvider сериализует JSON через orjson, если он установлен;
+  без него используется стандартный провайдер Flask.
+- Параметр запроса layout=columns заменяет списки однотипных записей
+  колоночным видом {поле: [значения]}: имена полей не повторяются
+  в каждой строке.
+- compress_response сжимает ответы brotli (если установлен) или gzip
+  по заголовку Accept-Encoding.
+- conditional_get выдает ETag по версии данных и сборки (build_version)
+  и отвечает 304, если у клиента уже есть ответ для текущих версий.
+"""
+import functools
+import gzip
+import hashlib
+
+try:
+    import orjson
+except ImportError:  # ускоренная сериализация необязательна
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # без brotli ответы сжимаются gzip
+    brotli = None
+
+from flask import current_app, has_request_context, make_response, request
+from flask.json.provider import DefaultJSONProvider
+
+from config import BASE_DIR, Config
+from models.database import current_data_version
+
+def to_columns(obj):
+    """Списки записей с одинаковыми полями -> {поле: [значения]} (рекурсивно)"""
+    if isinstance(obj, dict):
+        return {key: to_columns(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        if obj and all(isinstance(item, dict) for item in obj):
+            keys = list(obj[0])
+            if all(list(item) == keys for item in obj):
+                return {key: [to_columns(item[key]) for item in obj] for key in keys}
+        return [to_columns(item) for item in obj]
+    return obj
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON-провайдер с orjson и колоночным видом ответа по layout=columns"""
+
+    def dumps(self, obj, **kwargs):
+        # orjson пишет только компактный UTF-8; отступы (режим отладки)
+        # и нестандартные параметры остаются стандартному провайдеру
+        if orjson is None or 'indent' in kwargs or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if has_request_context() and request.args.get('layout') == 'columns':
+            obj = self._prepare_response_obj(args, kwargs)
+            return super().response(to_columns(obj))
+        return super().response(*args, **kwargs)
+
+# Типы ответов, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/csv', 'text/css', 'application/javascript'}
+
+def _encoding(accept_encoding):
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """Сжатие готового ответа (обработчик after_request).
+
+    Потоковые ответы (выгрузка) и файлы статики, отдаваемые напрямую,
+    не сжимаются.
+    """
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = _encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    else:
+        data = gzip.compress(data, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL'])
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# Файлы, от которых зависят тела ответов
+BUILD_SOURCES = ('app.py', 'config.py', 'models/*.py', 'templates/**/*', 'static/**/*')
+
+@functools.lru_cache(maxsize=None)
+def build_version():
+    """Версия сборки: APP_VERSION или хэш файлов BUILD_SOURCES"""
+    if Config.APP_VERSION:
+        return Config.APP_VERSION
+    digest = hashlib.sha256()
+    for path in sorted({path for pattern in BUILD_SOURCES for path in BASE_DIR.glob(pattern)
+                        if path.is_file()}):
+        digest.update(path.relative_to(BASE_DIR).as_posix().encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+def conditional_get(view):
+    """ETag по версии данных и сборки и ответ 304 Not Modified на повторный запрос.
+
+    Ответ зависит от данных, адреса запроса и кода приложения: после
+    импорта или развертывания ETag меняется и клиент получает новый ответ.
+    """
+    @functools.wraps(view)
+    def decorated(*args, **kwargs):
+        etag = f'v{current_data_version()}-{build_version()}'
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag, weak=True)
+            # Кэшировать можно, но перед использованием — проверить ETag
+            response.cache_control.no_cache = True
+        return response
+    return decorated
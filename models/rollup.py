@@ -0,0 +1,208 @@
+"""Предагрегированная таблица seller_month_rollup.
+
+Строка таблицы — сумма заказов одной группы (продавец, организатор,
+событие, год, месяц, статус оплаты). Дополнительно группа делится по
+признакам строки, от которых зависят бизнес-правила выручки:
+знак агентского вознаграждения и процента, полный возврат. Благодаря
+этому любые условия вида agent_amount > 0 или refund_amount != order_amount
+вычисляются по агрегату без обращения к tickets.
+"""
+
+# Ключ группы: колонка таблицы -> выражение над tickets
+KEY_COLUMNS = (
+    ('seller', 'seller'),
+    ('organizer', 'organizer'),
+    ('event_name', 'event_name'),
+    ('year', 'year'),
+    ('month', 'month'),
+    ('payment_status', 'payment_status'),
+    ('agent_sign', '(agent_amount > 0) - (agent_amount < 0)'),
+    ('percent_sign', '(agent_percent > 0) - (agent_percent < 0)'),
+    ('full_refund', 'refund_amount = order_amount'),
+)
+
+# Суммируемые показатели: колонка таблицы -> агрегат над tickets
+MEASURES = (
+    ('orders_count', 'COUNT(*)'),
+    ('tickets_count', 'SUM(tickets_count)'),
+    ('order_amount', 'SUM(order_amount)'),
+    ('agent_amount', 'SUM(agent_amount)'),
+    ('system_amount', 'SUM(system_amount)'),
+    ('organizer_amount', 'SUM(organizer_amount)'),
+    ('refund_amount', 'SUM(refund_amount)'),
+    ('refunds_count', 'SUM(refund_amount > 0)'),
+    ('positive_refund_amount', 'SUM(CASE WHEN refund_amount > 0 THEN refund_amount ELSE 0 END)'),
+)
+
+ROLLUP_TABLE = '''
+CREATE TABLE IF NOT EXISTS seller_month_rollup (
+    seller TEXT NOT NULL,
+    organizer TEXT NOT NULL,
+    event_name TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    payment_status TEXT NOT NULL,
+    agent_sign INTEGER NOT NULL,
+    percent_sign INTEGER NOT NULL,
+    full_refund INTEGER NOT NULL,
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    tickets_count INTEGER NOT NULL DEFAULT 0,
+    order_amount REAL NOT NULL DEFAULT 0,
+    agent_amount REAL NOT NULL DEFAULT 0,
+    system_amount REAL NOT NULL DEFAULT 0,
+    organizer_amount REAL NOT NULL DEFAULT 0,
+    refund_amount REAL NOT NULL DEFAULT 0,
+    refunds_count INTEGER NOT NULL DEFAULT 0,
+    positive_refund_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller, organizer, event_name, year, month,
+                 payment_status, agent_sign, percent_sign, full_refund)
+) WITHOUT ROWID
+'''
+
+# Индекс (year, month) не покрывал ни один запрос, а без статистики
+# перехватывал у первичного ключа запросы продавца с фильтром по году;
+# панели дашборда читают таблицу одним проходом и без него
+OBSOLETE_ROLLUP_INDEXES = ('idx_rollup_year',)
+
+# Таблицы агрегатов, статистика которых обновляется после импорта
+ROLLUP_TABLES = ('seller_month_rollup', 'seller_summary')
+
+# Ограничение на число параметров в одном запросе SQLite
+MAX_SQL_PARAMS = 500
+
+_KEYS = ', '.join(column for column, _ in KEY_COLUMNS)
+_KEY_EXPRS = ', '.join(expr for _, expr in KEY_COLUMNS)
+_MEASURES = ', '.join(column for column, _ in MEASURES)
+
+def _select_groups(where, sign=''):
+    measures = ', '.join(f'{sign}{expr}' for _, expr in MEASURES)
+    return f'''
+        SELECT {_KEY_EXPRS}, {measures}
+        FROM tickets
+        WHERE {where}
+        GROUP BY {', '.join(str(i) for i in range(1, len(KEY_COLUMNS) + 1))}
+    '''
+
+def create_rollup(conn):
+    """Создание таблицы агрегатов и удаление ее устаревших индексов"""
+    conn.execute(ROLLUP_TABLE)
+    for index_name in OBSOLETE_ROLLUP_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+def rebuild_rollup(conn):
+    """Полный пересчет агрегатов по таблице tickets"""
+    conn.execute('DELETE FROM seller_month_rollup')
+    conn.execute(f'INSERT INTO seller_month_rollup ({_KEYS}, {_MEASURES}) {_select_groups("1")}')
+
+def ensure_rollup(conn):
+    """Заполнение агрегатов, итогов продавцов и их статистики для баз,
+    загруженных до появления этих таблиц"""
+    create_rollup(conn)
+    create_seller_summary(conn)
+    if (not conn.execute('SELECT 1 FROM seller_month_rollup LIMIT 1').fetchone()
+            and conn.execute('SELECT 1 FROM tickets LIMIT 1').fetchone()):
+        rebuild_rollup(conn)
+    if (not conn.execute('SELECT 1 FROM seller_summary LIMIT 1').fetchone()
+            and conn.execute('SELECT 1 FROM seller_month_rollup LIMIT 1').fetchone()):
+        refresh_seller_summary(conn)
+    analyzed = set()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone():
+        analyzed = {row[0] for row in conn.execute('SELECT tbl FROM sqlite_stat1')}
+    if not analyzed.issuperset(ROLLUP_TABLES):
+        analyze_rollup(conn)
+
+def analyze_rollup(conn):
+    """Статистика планировщика по таблицам агрегатов: без нее SQLite может
+    выбрать для запросов продавца не первичный ключ"""
+    for table in ROLLUP_TABLES:
+        conn.execute(f'ANALYZE {table}')
+
+# Итоги продавцов по seller_month_rollup: строка на продавца и год,
+# year = 0 — за все время. Два набора показателей с разными правилами:
+# без префикса — /api/seller-stats (все заказы, кроме неоплаченных,
+# см. queries.seller_stats_query), paid_* — карточки страницы продавца
+# (оплаченные заказы без полного возврата, см. queries.get_seller_page)
+_NOT_UNPAID = "payment_status != 'Не оплачен'"
+_PAID = f"{_NOT_UNPAID} AND full_refund = 0"
+_RETURNED = "payment_status = 'Возвращен'"
+_UNREWARDED = "agent_sign = 0 AND percent_sign > 0 AND payment_status = 'Оплачен'"
+_DIRECT = "organizer = seller AND percent_sign < 0"
+_DIRECT_UNREWARDED = f"{_DIRECT} AND agent_sign = 0 AND payment_status = 'Оплачен'"
+# Выручка группы за вычетом возвратов и заказов без вознаграждения
+# (то же правило, что schema.DERIVED_COLUMNS['net_revenue'])
+_NET_REVENUE = (f"order_amount - CASE WHEN {_RETURNED} THEN refund_amount ELSE 0 END"
+                f" - CASE WHEN {_UNREWARDED} THEN order_amount ELSE 0 END")
+
+def _sum_if(condition, value):
+    return f"SUM(CASE WHEN {condition} THEN {value} ELSE 0 END)"
+
+# Колонка -> (тип, агрегат над seller_month_rollup)
+SUMMARY_MEASURES = {
+    'revenue': ('REAL', _sum_if(_NOT_UNPAID, _NET_REVENUE)),
+    'agent': ('REAL', _sum_if(_NOT_UNPAID, 'agent_amount')),
+    'commission': ('REAL', _sum_if(_NOT_UNPAID, 'system_amount')),
+    # Билеты без возвращенных, без вознаграждения и прямых продаж без агента
+    'tickets': ('INTEGER', f"{_sum_if(_NOT_UNPAID, 'tickets_count')}"
+                           f" - {_sum_if(_RETURNED, 'tickets_count')}"
+                           f" - {_sum_if(_UNREWARDED, 'tickets_count')}"
+                           f" - {_sum_if(_DIRECT_UNREWARDED, 'tickets_count')}"),
+    'orders': ('INTEGER', _sum_if(_NOT_UNPAID, 'orders_count')),
+    'refunds': ('REAL', f"{_sum_if(_RETURNED, 'refund_amount')}"
+                        f" - {_sum_if(f'{_RETURNED} AND {_DIRECT}', 'refund_amount')}"),
+    'paid_revenue': ('REAL', _sum_if(_PAID, _NET_REVENUE)),
+    'paid_agent': ('REAL', _sum_if(_PAID, 'agent_amount')),
+    'paid_commission': ('REAL', _sum_if(_PAID, 'system_amount')),
+    'paid_tickets': ('INTEGER', _sum_if(_PAID, 'tickets_count')),
+    'paid_orders': ('INTEGER', _sum_if(_PAID, 'orders_count')),
+    'paid_refunds': ('REAL', _sum_if(f'{_PAID} AND {_RETURNED}', 'refund_amount')),
+    'paid_refunds_count': ('INTEGER', _sum_if(f'{_PAID} AND {_RETURNED}', 'refunds_count')),
+    'paid_positive_refunds': ('REAL', _sum_if(f'{_PAID} AND {_RETURNED}', 'positive_refund_amount')),
+    'returned_amount': ('REAL', _sum_if(_RETURNED, 'positive_refund_amount')),
+}
+
+SUMMARY_TABLE = f'''
+CREATE TABLE IF NOT EXISTS seller_summary (
+    seller TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    {', '.join(f'{column} {column_type} NOT NULL DEFAULT 0'
+               for column, (column_type, _) in SUMMARY_MEASURES.items())},
+    PRIMARY KEY (seller, year)
+) WITHOUT ROWID
+'''
+
+def create_seller_summary(conn):
+    conn.execute(SUMMARY_TABLE)
+
+def refresh_seller_summary(conn):
+    """Пересчет итогов продавцов по агрегатам; выполняется в транзакции импорта"""
+    columns = ', '.join(SUMMARY_MEASURES)
+    measures = ', '.join(expr for _, expr in SUMMARY_MEASURES.values())
+    conn.execute('DELETE FROM seller_summary')
+    conn.execute(f'''
+        INSERT INTO seller_summary (seller, year, {columns})
+        SELECT seller, year, {measures} FROM seller_month_rollup GROUP BY seller, year
+        UNION ALL
+        SELECT seller, 0, {measures} FROM seller_month_rollup GROUP BY seller
+    ''')
+
+def apply_orders(conn, order_ids, sign=1):
+    """Добавление (sign=1) или вычитание (sign=-1) вклада заказов в агрегаты.
+
+    Перед обновлением заказов их старые значения вычитаются, после —
+    добавляются новые, поэтому агрегаты обновляются в той же транзакции,
+    что и сами строки.
+    """
+    order_ids = list(order_ids)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column, _ in MEASURES)
+    for start in range(0, len(order_ids), MAX_SQL_PARAMS):
+        chunk = order_ids[start:start + MAX_SQL_PARAMS]
+        placeholders = ','.join('?' * len(chunk))
+        conn.execute(f'''
+            INSERT INTO seller_month_rollup ({_KEYS}, {_MEASURES})
+            {_select_groups(f"order_id IN ({placeholders})", '' if sign > 0 else '-')}
+            ON CONFLICT ({_KEYS}) DO UPDATE SET {updates}
+        ''', chunk)
+
+def prune_rollup(conn):
+    """Удаление групп, в которых не осталось заказов"""
+    conn.execute('DELETE FROM seller_month_rollup WHERE orders_count = 0')
@@ -0,0 +1,332 @@
+"""Схема базы данных, общая для веб-приложения и импортера"""
+
+from models.rollup import create_rollup
+
+# Колонки tickets в порядке вставки (без id)
+TICKET_COLUMNS = (
+    'order_id', 'order_date', 'order_time', 'client_name', 'client_email',
+    'client_phone', 'event_name', 'event_date', 'event_time', 'organizer',
+    'seller', 'tickets_count', 'order_amount', 'discount_code',
+    'discount_amount', 'agent_percent', 'system_percent', 'organizer_amount',
+    'agent_amount', 'system_amount', 'discount_value', 'payment_status',
+    'ticket_status', 'refund_date', 'refund_amount', 'erb_amount', 'year',
+    'month', 'booking_hour', 'flight_hour',
+)
+
+# Повторяющиеся текстовые колонки хранятся в справочниках:
+# колонка tickets -> (колонка ticket_facts, справочник). Продавцы и
+# организаторы лежат в одном справочнике, поэтому seller = organizer
+# сводится к сравнению seller_id = organizer_id
+DIMENSION_COLUMNS = {
+    'event_name': ('event_id', 'dim_event'),
+    'organizer': ('organizer_id', 'dim_party'),
+    'seller': ('seller_id', 'dim_party'),
+    'payment_status': ('payment_status_id', 'dim_payment_status'),
+    'ticket_status': ('ticket_status_id', 'dim_ticket_status'),
+}
+
+DIMENSION_TABLES = ('dim_party', 'dim_event', 'dim_payment_status', 'dim_ticket_status')
+
+DIMENSION_TABLE = '''
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+)
+'''
+
+# Колонки ticket_facts в порядке TICKET_COLUMNS
+FACT_COLUMNS = tuple(
+    DIMENSION_COLUMNS[column][0] if column in DIMENSION_COLUMNS else column
+    for column in TICKET_COLUMNS
+)
+
+TICKET_FACTS_TABLE = '''
+CREATE TABLE IF NOT EXISTS ticket_facts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT,
+    order_date TEXT,
+    order_time TEXT,
+    client_name TEXT,
+    client_email TEXT,
+    client_phone TEXT,
+    event_id INTEGER REFERENCES dim_event(id),
+    event_date TEXT,
+    event_time TEXT,
+    organizer_id INTEGER REFERENCES dim_party(id),
+    seller_id INTEGER REFERENCES dim_party(id),
+    tickets_count INTEGER,
+    order_amount REAL,
+    discount_code TEXT,
+    discount_amount REAL,
+    agent_percent REAL,
+    system_percent REAL,
+    organizer_amount REAL,
+    agent_amount REAL,
+    system_amount REAL,
+    discount_value REAL,
+    payment_status_id INTEGER REFERENCES dim_payment_status(id),
+    ticket_status_id INTEGER REFERENCES dim_ticket_status(id),
+    refund_date TEXT,
+    refund_amount REAL,
+    erb_amount REAL,
+    year INTEGER,
+    month INTEGER,
+    booking_hour INTEGER,
+    flight_hour INTEGER,
+    is_refunded INTEGER NOT NULL DEFAULT 0,
+    is_unpaid INTEGER NOT NULL DEFAULT 0,
+    is_unrewarded INTEGER NOT NULL DEFAULT 0,
+    is_direct_sale INTEGER NOT NULL DEFAULT 0,
+    net_revenue REAL NOT NULL DEFAULT 0
+)
+'''
+
+def _status_id(name):
+    return f"(SELECT id FROM dim_payment_status WHERE name = '{name}')"
+
+# Производные колонки бизнес-правил выручки: колонка -> (тип, выражение над
+# ticket_facts). Значения вычисляет импортер (derived_values), выражения
+# нужны для заполнения колонок в базах прежней схемы:
+#   is_refunded    — заказ возвращен;
+#   is_unpaid      — заказ не оплачен;
+#   is_unrewarded  — оплачен с процентом агента, но без вознаграждения;
+#   is_direct_sale — продавец сам организатор и процент агента отрицательный;
+#   net_revenue    — сумма заказа за вычетом возврата и невознагражденной продажи.
+DERIVED_COLUMNS = {
+    'is_refunded': ('INTEGER', f"IFNULL(payment_status_id = {_status_id('Возвращен')}, 0)"),
+    'is_unpaid': ('INTEGER', f"IFNULL(payment_status_id = {_status_id('Не оплачен')}, 0)"),
+    'is_unrewarded': ('INTEGER', "IFNULL(agent_amount = 0 AND agent_percent > 0 "
+                                 f"AND payment_status_id = {_status_id('Оплачен')}, 0)"),
+    'is_direct_sale': ('INTEGER', 'IFNULL(organizer_id = seller_id AND agent_percent < 0, 0)'),
+    'net_revenue': ('REAL', f'''IFNULL(order_amount, 0)
+        - CASE WHEN payment_status_id = {_status_id('Возвращен')} THEN IFNULL(refund_amount, 0) ELSE 0 END
+        - CASE WHEN agent_amount = 0 AND agent_percent > 0
+                    AND payment_status_id = {_status_id('Оплачен')} THEN IFNULL(order_amount, 0) ELSE 0 END'''),
+}
+
+_POSITIONS = {column: position for position, column in enumerate(TICKET_COLUMNS)}
+
+def derived_values(row):
+    """Значения DERIVED_COLUMNS для строки импорта в порядке TICKET_COLUMNS"""
+    def value(column):
+        return row[_POSITIONS[column]]
+
+    status = value('payment_status')
+    order_amount = value('order_amount') or 0
+    is_refunded = status == 'Возвращен'
+    is_unrewarded = value('agent_amount') == 0 and value('agent_percent') > 0 and status == 'Оплачен'
+    net_revenue = (order_amount
+                   - ((value('refund_amount') or 0) if is_refunded else 0)
+                   - (order_amount if is_unrewarded else 0))
+    return (
+        int(is_refunded),
+        int(status == 'Не оплачен'),
+        int(is_unrewarded),
+        int(value('organizer') == value('seller') and value('agent_percent') < 0),
+        net_revenue,
+    )
+
+def _view_column(column):
+    """Колонка представления tickets: название из справочника или колонка фактов"""
+    if column not in DIMENSION_COLUMNS:
+        return column
+    fact_column, table = DIMENSION_COLUMNS[column]
+    return f"(SELECT name FROM {table} WHERE {table}.id = ticket_facts.{fact_column}) AS {column}"
+
+_VIEW_COLUMNS = ',\n    '.join(
+    ['id']
+    + [_view_column(column) for column in TICKET_COLUMNS]
+    + [fact_column for fact_column, _ in DIMENSION_COLUMNS.values()]
+    + list(DERIVED_COLUMNS)
+)
+
+# Представление с прежними колонками tickets и id справочников: запросы
+# на чтение работают без изменений. Названия берутся подзапросами, которые
+# вычисляются только для колонок, используемых запросом; фильтры по
+# справочникам выгоднее задавать через *_id (см. models.filters)
+TICKETS_VIEW = f'''
+CREATE VIEW IF NOT EXISTS tickets AS
+SELECT
+    {_VIEW_COLUMNS}
+FROM ticket_facts
+'''
+
+# Хэши импортированных файлов (scope = 'file', key = имя файла)
+# и строк (scope = 'row', key = order_id) для инкрементальной загрузки
+IMPORT_HASHES_TABLE = '''
+CREATE TABLE IF NOT EXISTS import_hashes (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID
+'''
+
+# Служебные значения базы. data_version увеличивается импортером при
+# каждой фиксации новых данных и входит в ключи кэша веб-приложения
+META_TABLE = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+) WITHOUT ROWID
+'''
+
+# Уникальный ключ заказа; не удаляется при массовой загрузке,
+# так как на нем основан UPSERT
+ORDER_KEY_INDEX = 'CREATE UNIQUE INDEX IF NOT EXISTS uq_tickets_order_id ON ticket_facts(order_id)'
+
+# Колонки покрывающего индекса показателей продавца (см. queries.seller_stats_query)
+SELLER_STATS_COLUMNS = (
+    'seller_id', 'year', 'month', 'payment_status_id', 'order_id', 'tickets_count',
+    'agent_amount', 'system_amount', 'refund_amount', 'net_revenue',
+    'is_refunded', 'is_unrewarded', 'is_direct_sale', 'is_unpaid',
+)
+
+# Управляемый набор вторичных индексов ticket_facts (см. create_indexes и
+# python -m models.indexes). Индексы по продавцу покрывают свои запросы,
+# чтобы SQLite читал только индекс, без обращения к строкам таблицы:
+#   idx_seller_cover      — динамика продавца и список его событий;
+#   idx_seller_paid_cover — частичный индекс показателей продавца
+#                           (условие совпадает с фильтром exclude_unpaid);
+#   idx_year_month        — список лет и фильтр по периоду;
+#   idx_year_status_hours — распределение заказов по часам;
+#   idx_payment_status    — список статусов оплаты.
+INDEXES = {
+    'idx_seller_cover': 'CREATE INDEX IF NOT EXISTS idx_seller_cover ON ticket_facts(seller_id, year, month, payment_status_id, event_id, agent_amount)',
+    'idx_seller_paid_cover': f"CREATE INDEX IF NOT EXISTS idx_seller_paid_cover ON ticket_facts({', '.join(SELLER_STATS_COLUMNS)}) WHERE is_unpaid = 0",
+    'idx_year_month': 'CREATE INDEX IF NOT EXISTS idx_year_month ON ticket_facts(year, month)',
+    'idx_year_status_hours': 'CREATE INDEX IF NOT EXISTS idx_year_status_hours ON ticket_facts(year, payment_status_id, booking_hour, flight_hour)',
+    'idx_payment_status': 'CREATE INDEX IF NOT EXISTS idx_payment_status ON ticket_facts(payment_status_id)',
+}
+
+def create_tables(conn):
+    """Создание таблиц, если они еще не существуют"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets'").fetchone():
+        migrate_tickets(conn)
+    for table in DIMENSION_TABLES:
+        conn.execute(DIMENSION_TABLE.format(name=table))
+    conn.execute(TICKET_FACTS_TABLE)
+    ensure_derived_columns(conn)
+    conn.execute(ORDER_KEY_INDEX)
+    conn.execute(TICKETS_VIEW)
+    conn.execute(IMPORT_HASHES_TABLE)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_import_hash ON import_hashes(hash)')
+    conn.execute(META_TABLE)
+    create_rollup(conn)
+
+def get_data_version(conn):
+    """Текущая версия данных (0, если импорт еще не выполнялся)"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn):
+    """Увеличение версии данных; фиксируется вместе с транзакцией импорта"""
+    conn.execute('''
+        INSERT INTO meta (key, value) VALUES ('data_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    ''')
+
+def set_bulk_load(conn, active):
+    """Отметка массовой загрузки: пока она идет, индексов нет и веб-приложение
+    не должно их строить (см. database.init_db)"""
+    if active:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bulk_load', 1)")
+    else:
+        conn.execute("DELETE FROM meta WHERE key = 'bulk_load'")
+
+def is_bulk_load(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+        return False
+    return conn.execute("SELECT 1 FROM meta WHERE key = 'bulk_load'").fetchone() is not None
+
+def migrate_tickets(conn):
+    """Перенос таблицы tickets прежней схемы в ticket_facts и справочники.
+
+    Дубликаты заказов отбрасываются, остается последняя загруженная версия.
+    Таблица tickets удаляется вместе с ее индексами и заменяется представлением.
+    """
+    for table in DIMENSION_TABLES:
+        conn.execute(DIMENSION_TABLE.format(name=table))
+    for column, (_, table) in DIMENSION_COLUMNS.items():
+        conn.execute(f'''
+            INSERT OR IGNORE INTO {table} (name)
+            SELECT DISTINCT {column} FROM tickets WHERE {column} IS NOT NULL
+        ''')
+
+    values = ', '.join(
+        f'(SELECT id FROM {DIMENSION_COLUMNS[column][1]} WHERE name = tickets.{column})'
+        if column in DIMENSION_COLUMNS else column
+        for column in TICKET_COLUMNS
+    )
+    conn.execute(TICKET_FACTS_TABLE)
+    conn.execute(f'''
+        INSERT INTO ticket_facts (id, {', '.join(FACT_COLUMNS)})
+        SELECT id, {values} FROM tickets
+        WHERE id IN (SELECT MAX(id) FROM tickets GROUP BY order_id)
+    ''')
+    update_derived_columns(conn)
+    conn.execute('DROP TABLE tickets')
+
+def update_derived_columns(conn):
+    """Пересчет производных колонок всех строк ticket_facts"""
+    assignments = ', '.join(f'{column} = {expr}' for column, (_, expr) in DERIVED_COLUMNS.items())
+    conn.execute(f'UPDATE ticket_facts SET {assignments}')
+
+def ensure_derived_columns(conn):
+    """Добавление производных колонок в ticket_facts, созданную без них.
+
+    Представление tickets пересоздается, чтобы в нем появились новые колонки.
+    """
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(ticket_facts)')}
+    missing = [column for column in DERIVED_COLUMNS if column not in existing]
+    if not missing:
+        return
+    for column in missing:
+        column_type, _ = DERIVED_COLUMNS[column]
+        conn.execute(f'ALTER TABLE ticket_facts ADD COLUMN {column} {column_type} NOT NULL DEFAULT 0')
+    update_derived_columns(conn)
+    conn.execute('DROP VIEW IF EXISTS tickets')
+
+def ensure_statistics(conn):
+    """Сбор статистики планировщика, если по какому-то индексу ее еще нет.
+
+    Без статистики SQLite может предпочесть индекс (year, payment_status_id)
+    индексу продавца в запросах с фильтром по продавцу.
+    """
+    analyzed = set()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone():
+        analyzed = {row[0] for row in conn.execute('SELECT idx FROM sqlite_stat1')}
+    if not analyzed.issuperset(INDEXES):
+        conn.execute('ANALYZE ticket_facts')
+
+# Индексы, замененные составными и покрывающими, и индексы без запросов
+OBSOLETE_INDEXES = (
+    'idx_seller', 'idx_year', 'idx_seller_year_month', 'idx_order_date',
+    'idx_agent_amount', 'idx_system_amount',
+)
+
+def _stored_sql(index_sql):
+    """Текст CREATE INDEX в том виде, в котором SQLite хранит его в sqlite_master"""
+    return index_sql.replace('IF NOT EXISTS ', '')
+
+def create_indexes(conn):
+    """Приведение вторичных индексов к набору INDEXES.
+
+    Устаревшие индексы удаляются, индексы с измененным определением
+    пересоздаются, недостающие создаются.
+    """
+    for name in OBSOLETE_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    existing = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'ticket_facts'"
+    ).fetchall())
+    for name, index_sql in INDEXES.items():
+        if name in existing and existing[name] != _stored_sql(index_sql):
+            conn.execute(f'DROP INDEX {name}')
+        conn.execute(index_sql)
+
+def drop_indexes(conn):
+    """Удаление вторичных индексов (перед массовой загрузкой)"""
+    for name in INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,140 @@
+"""Опубликованные снимки базы для веб-приложения.
+
+При заданном DATABASE_SNAPSHOT_DIR импорт по-прежнему пишет в рабочую
+базу (DATABASE_PATH), а веб-приложение читает только снимки: рабочая база
+копируется VACUUM INTO в новый файл папки снимков (со свежей статистикой
+планировщика), после чего файл CURRENT атомарно переключается на него.
+Опубликованный снимок больше не меняется, поэтому соединения открывают его
+с immutable=1 — без блокировок и проверок изменений, страницы читаются
+через mmap. Читатели никогда не ждут записи: соединение пула
+переоткрывается, когда CURRENT указывает на новый снимок, а уже идущие
+запросы дочитывают прежний.
+
+Снимки не заменяют друг друга на месте (в Windows открытый файл заменить
+нельзя), а получают новые имена. Старые снимки удаляются при следующей
+публикации, кроме предыдущего: его еще могут читать.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from config import Config
+from models.schema import get_data_version
+
+POINTER_NAME = 'CURRENT'
+SNAPSHOT_PREFIX = 'tickets-'
+
+def _read_pointer(directory):
+    try:
+        name = (Path(directory) / POINTER_NAME).read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    return str(Path(directory) / name) if name else None
+
+# Прочитанные указатели: папка -> (inode, mtime и размер CURRENT, путь)
+_pointers = {}
+
+def current_snapshot(directory):
+    """Путь к текущему снимку или None, если снимок еще не опубликован.
+
+    Вызывается на каждое соединение пула, поэтому CURRENT перечитывается
+    только после замены файла: os.replace меняет его inode и mtime.
+    """
+    try:
+        stat = os.stat(os.path.join(directory, POINTER_NAME))
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _pointers.get(directory)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    path = _read_pointer(directory)
+    _pointers[directory] = (key, path)
+    return path
+
+def snapshot_uri(path):
+    """URI снимка для sqlite3.connect(uri=True): только чтение, без блокировок"""
+    return f"{Path(path).resolve().as_uri()}?mode=ro&immutable=1"
+
+def open_snapshot(path, factory=sqlite3.Connection):
+    return sqlite3.connect(snapshot_uri(path), uri=True, factory=factory)
+
+def _schema(conn):
+    return {tuple(row) for row in conn.execute('SELECT type, name FROM sqlite_master')}
+
+def is_current(conn, directory):
+    """Текущий снимок совпадает с рабочей базой conn по версии данных и схеме"""
+    path = current_snapshot(directory)
+    if path is None or not os.path.exists(path):
+        return False
+    with closing(open_snapshot(path)) as snapshot:
+        return (get_data_version(snapshot) == get_data_version(conn)
+                and _schema(snapshot) == _schema(conn))
+
+def _fsync(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+def _write_pointer(directory, name):
+    temp = directory / f'{POINTER_NAME}.tmp'
+    temp.write_text(name, encoding='utf-8')
+    _fsync(temp)
+    os.replace(temp, directory / POINTER_NAME)
+
+def _remove_old(directory, keep):
+    for path in directory.glob(f'{SNAPSHOT_PREFIX}*'):
+        if path.name in keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # Снимок еще открыт (Windows) — удалится при следующей публикации
+            pass
+
+def publish_snapshot(conn, directory):
+    """Копирование рабочей базы conn в новый снимок и переключение CURRENT.
+
+    Вызывается вне транзакции. Возвращает путь к новому снимку.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    previous = _read_pointer(directory)
+
+    path = directory / f"{SNAPSHOT_PREFIX}{get_data_version(conn)}-{time.time_ns()}.db"
+    temp = path.with_suffix('.tmp')
+    conn.execute('VACUUM INTO ?', (str(temp),))
+    # SQLite не сбрасывает результат VACUUM INTO на диск: без fsync после
+    # сбоя питания CURRENT мог бы указать на недописанный файл
+    _fsync(temp)
+    os.replace(temp, path)
+    _write_pointer(directory, path.name)
+
+    _remove_old(directory, {path.name, previous and Path(previous).name})
+    return str(path)
+
+def ensure_snapshot(conn, directory, analyze=True):
+    """Публикация снимка рабочей базы conn, если текущий снимок устарел.
+
+    Перед копированием собирается статистика планировщика (ANALYZE), если
+    ее не собрал сам импорт (analyze=False). Публикации из нескольких
+    процессов (воркеры при запуске, импорт) выполняются по очереди, вторая
+    застает свежий снимок и ничего не копирует. Возвращает путь к снимку.
+    """
+    if is_current(conn, directory):
+        return current_snapshot(directory)
+    if analyze:
+        conn.execute('ANALYZE')
+        conn.commit()
+
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    with closing(sqlite3.connect(db_path, timeout=Config.SQLITE_BUSY_TIMEOUT / 1000)) as lock:
+        # Запись в рабочую базу блокируется на время копирования, чтение — нет
+        lock.execute('BEGIN IMMEDIATE')
+        try:
+            if not is_current(conn, directory):
+                publish_snapshot(conn, directory)
+        finally:
+            lock.rollback()
+    return current_snapshot(directory)
@@ -0,0 +1,123 @@
+"""Фоновый прогрев кэша ответов после запуска приложения и после импорта.
+
+Для каждой версии данных один раз запрашиваются типовые адреса дашборда:
+панели для всех сочетаний года и статуса оплаты из /api/years и
+/api/statuses, справочники и страницы первых продавцов рейтинга. Запросы
+идут через обычные представления (тестовым клиентом Flask), поэтому ответы
+попадают в кэш под теми же ключами, что и запросы браузера. Новая версия
+данных замечается на очередном запросе (проверка не чаще раза в
+CACHE_WARMUP_CHECK_INTERVAL секунд), и прогрев запускается заново.
+Запросы прогрева не попадают в метрики models.profiling.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from urllib.parse import urlencode
+
+from flask_caching.backends import NullCache
+
+from models.database import current_data_version
+from models.profiling import UNPROFILED_ENVIRON
+from models.responses import build_version
+from models.queries import get_statuses, get_top_sellers, get_years
+
+# Панели, зависящие от фильтров year и status
+FILTERED_URLS = (
+    '/api/dashboard',
+    '/api/summary',
+    '/api/top-sellers',
+    '/api/booking-segments',
+    '/api/flight-segments',
+    '/api/time-segments',
+)
+
+# Ответы без фильтров
+STATIC_URLS = (
+    '/api/years',
+    '/api/statuses',
+    '/api/sellers',
+    '/api/sales-trend',
+    '/api/direct-sales',
+    '/api/all-agents',
+)
+
+_lock = threading.Lock()
+_warmed_version = None
+
+def warmup_urls(top_sellers=10):
+    """Адреса для прогрева в порядке убывания пользы"""
+    years = [None] + get_years()
+    statuses = [None] + get_statuses()
+    urls = list(STATIC_URLS)
+    for year, status in product(years, statuses):
+        args = {key: value for key, value in (('year', year), ('status', status)) if value}
+        query = f"?{urlencode(args)}" if args else ''
+        urls.extend(f"{url}{query}" for url in FILTERED_URLS)
+    for seller in get_top_sellers()[:top_sellers]:
+        urls.append(f"/seller?{urlencode({'name': seller['seller']})}")
+    return urls
+
+def warm_cache(app, urls, workers=2):
+    """Запрос адресов не более чем в workers потоков; возвращает адреса с ошибками"""
+    def fetch(url):
+        response = app.test_client().get(url, environ_base={UNPROFILED_ENVIRON: True})
+        return url, response.status_code
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmup') as executor:
+        failed = [url for url, status in executor.map(fetch, urls) if status != 200]
+    for url in failed:
+        app.logger.warning("Прогрев кэша: ошибка ответа %s", url)
+    return failed
+
+def _run(app, version):
+    try:
+        with app.app_context():
+            urls = warmup_urls(app.config['CACHE_WARMUP_SELLERS'])
+        warm_cache(app, urls, app.config['CACHE_WARMUP_WORKERS'])
+        app.logger.info("Прогрев кэша для версии данных %s: %d адресов", version, len(urls))
+    except Exception:
+        app.logger.exception("Прогрев кэша для версии данных %s прерван", version)
+
+def start_warmup(app, cache):
+    """Запуск прогрева в фоновом потоке, если текущая версия данных еще не прогрета.
+
+    Версия отмечается в общем кэше, поэтому из нескольких воркеров
+    прогрев выполняет один.
+    """
+    global _warmed_version
+    with app.app_context():
+        version = current_data_version()
+    with _lock:
+        if version == _warmed_version:
+            return False
+        _warmed_version = version
+    # Ключи кэша ответов зависят и от сборки: новый код прогревается заново
+    if not cache.add(f"warmup:v{version}-{build_version()}", True):
+        return False
+    threading.Thread(target=_run, args=(app, version), name='cache-warmup', daemon=True).start()
+    return True
+
+def init_warmup(app, cache):
+    """Прогрев при запуске и после каждого импорта (по смене версии данных).
+
+    Версия данных проверяется не чаще раза в CACHE_WARMUP_CHECK_INTERVAL
+    секунд. Без кэша ответов (NullCache) прогревать нечего.
+    """
+    if not app.config['CACHE_WARMUP'] or isinstance(cache.cache, NullCache):
+        return
+
+    interval = app.config['CACHE_WARMUP_CHECK_INTERVAL']
+    next_check = time.monotonic() + interval
+
+    @app.before_request
+    def warm_new_version():
+        nonlocal next_check
+        now = time.monotonic()
+        with _lock:
+            if now < next_check:
+                return
+            next_check = now + interval
+        start_warmup(app, cache)
+
+    start_warmup(app, cache)
@@ -109,29 +109,130 @@ function updateDirectSalesTable(data) {
     }).join('');
 }
 
-function updateAllAgentsTable(data) {
+// Таблица с постраничной загрузкой: сортировка по заголовкам с data-sort,
+// поиск и подгрузка следующей страницы по курсору при прокрутке до кнопки
+function createPagedTable({ url, tbody, loadMore, searchInput, totalLabel, sort, order = 'desc', params, renderRow }) {
+    const table = tbody.closest('table');
+    const state = { sort, order, search: '', next: loadMore.dataset.next || null, count: tbody.rows.length };
+    let request = 0;
+    let loading = false;
+
+    function updateHeaders() {
+        table.querySelectorAll('th[data-sort]').forEach(th => {
+            if (th.dataset.sort === state.sort) th.dataset.order = state.order;
+            else delete th.dataset.order;
+        });
+    }
+
+    // Отрисовка страницы ответа: reset — начать таблицу заново
+    function show(page, reset = true) {
+        if (reset) {
+            tbody.innerHTML = '';
+            state.count = 0;
+        }
+        tbody.insertAdjacentHTML('beforeend', page.items.map(item => renderRow(item, ++state.count)).join(''));
+        state.next = page.next;
+        loadMore.hidden = !page.next;
+        if (totalLabel) totalLabel.textContent = page.total;
+    }
+
+    async function load(reset) {
+        if (!reset && (loading || !state.next)) return;
+        const current = ++request;
+        loading = true;
+        try {
+            const query = new URLSearchParams(params ? params() : undefined);
+            query.set('sort', state.sort);
+            query.set('order', state.order);
+            if (state.search) query.set('search', state.search);
+            if (!reset) query.set('after', state.next);
+
+            const page = await fetch(`${url}?${query}`).then(res => res.json());
+            if (page.error) throw new Error(page.error);
+            // Ответ устарел: сортировка или поиск изменились во время загрузки
+            if (current !== request) return;
+            show(page, reset);
+        } catch (error) {
+            showError('Ошибка загрузки таблицы: ' + error.message);
+        } finally {
+            if (current === request) loading = false;
+        }
+    }
+
+    table.querySelectorAll('th[data-sort]').forEach(th => {
+        th.addEventListener('click', () => {
+            if (state.sort === th.dataset.sort) {
+                state.order = state.order === 'desc' ? 'asc' : 'desc';
+            } else {
+                state.sort = th.dataset.sort;
+                state.order = 'desc';
+            }
+            updateHeaders();
+            load(true);
+        });
+    });
+
+    if (searchInput) {
+        let timer;
+        searchInput.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                state.search = searchInput.value.trim();
+                load(true);
+            }, 300);
+        });
+    }
+
+    loadMore.addEventListener('click', () => load(false));
+    if ('IntersectionObserver' in window) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) load(false);
+        }).observe(loadMore);
+    }
+
+    updateHeaders();
+    return { show, load };
+}
+
+function renderAgentRow(agent, index) {
+    const segmentClass = getSegmentClass(agent.agent_amount);
+    const segmentColor = getSegmentColor(agent.agent_amount);
+
+    return `
+        <tr class="${segmentClass}">
+            <td>${index}</td>
+            <td title="${escapeHtml(agent.seller)}">
+                <span class="segment-indicator" style="background-color: ${segmentColor}"></span>
+                <a href="/seller?name=${encodeURIComponent(agent.seller)}" class="seller-link">${escapeHtml(truncateText(agent.seller, 30))}</a>
+            </td>
+            <td>${formatCurrency(agent.agent_amount)}</td>
+            <td>${formatCurrency(agent.system_amount)}</td>
+            <td>${agent.orders_count}</td>
+            <td>${agent.tickets_count}</td>
+            <td>${formatCurrency(agent.total_revenue)}</td>
+        </tr>
+    `;
+}
+
+// Рейтинг всех агентов: первая страница приходит в /api/dashboard,
+// следующие — из /api/all-agents. Рейтинг не зависит от фильтров дашборда,
+// поэтому при их смене выбранные сортировка и поиск сохраняются
+let allAgentsTable = null;
+
+function updateAllAgentsTable(page) {
     const tbody = document.querySelector('#allAgentsTable tbody');
-    if (!tbody || !data || data.error) return;
-    
-    tbody.innerHTML = data.map((agent, index) => {
-        const segmentClass = getSegmentClass(agent.agent_amount);
-        const segmentColor = getSegmentColor(agent.agent_amount);
-        
-        return `
-            <tr class="${segmentClass}">
-                <td>${index + 1}</td>
-                <td title="${agent.seller}">
-                    <span class="segment-indicator" style="background-color: ${segmentColor}"></span>
-                    <a href="/seller?name=${encodeURIComponent(agent.seller)}" class="seller-link">${truncateText(agent.seller, 30)}</a>
-                </td>
-                <td>${formatCurrency(agent.agent_amount)}</td>
-                <td>${formatCurrency(agent.system_amount)}</td>
-                <td>${agent.orders_count}</td>
-                <td>${agent.tickets_count}</td>
-                <td>${formatCurrency(agent.total_revenue)}</td>
-            </tr>
-        `;
-    }).join('');
+    if (!tbody || !page || page.error || allAgentsTable) return;
+
+    allAgentsTable = createPagedTable({
+        url: '/api/all-agents',
+        tbody,
+        loadMore: document.getElementById('allAgentsLoadMore'),
+        searchInput: document.getElementById('allAgentsSearch'),
+        totalLabel: document.getElementById('allAgentsTotal'),
+        sort: 'agent_amount',
+        renderRow: renderAgentRow
+    });
+    allAgentsTable.show(page);
 }
 
 function updateTimeSegments(type, data) {
@@ -167,6 +268,16 @@ function truncateText(text, maxLength) {
     return text.length > maxLength ? text.substring(0, maxLength) + '...' : text;
 }
 
+// Экранирование текста из данных для вставки в HTML-разметку строк таблиц
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
 function getSegmentClass(amount) {
     if (!window.globalSegmentBounds) return '';
     if (amount < window.globalSegmentBounds[1]) return 'segment-low';
@@ -216,39 +327,20 @@ async function loadDashboardData() {
         if (currentFilters.year !== 'all') queryParams.append('year', currentFilters.year);
         if (currentFilters.status !== 'all') queryParams.append('status', currentFilters.status);
         
-        const urls = [
-            `/api/summary?${queryParams}`,
-            `/api/top-sellers?${queryParams}`,
-            `/api/direct-sales?${queryParams}`,
-            `/api/sales-trend?${queryParams}`,
-            `/api/all-agents?${queryParams}`,
-            `/api/booking-segments?${queryParams}`,
-            `/api/flight-segments?${queryParams}`
-        ];
+        // Все панели одним запросом
+        const data = await fetch(`/api/dashboard?${queryParams}`).then(res => res.json());
+        if (data.error) throw new Error(data.error);
         
-        const results = await Promise.all(
-            urls.map(url => fetch(url).then(res => res.json()))
-        );
-        
-        // Сохраняем границы сегментов для подсветки
-        if (results[4] && !results[4].error) {
-            const amounts = results[4].map(a => a.agent_amount).sort((a, b) => a - b);
-            window.globalSegmentBounds = [
-                0,
-                amounts[Math.floor(amounts.length * 0.25)],
-                amounts[Math.floor(amounts.length * 0.5)],
-                amounts[Math.floor(amounts.length * 0.75)],
-                Infinity
-            ];
-        }
+        // Сохраняем границы сегментов для подсветки (квартили по всем агентам)
+        window.globalSegmentBounds = [0, ...data.agent_quartiles, Infinity];
         
-        updateSummaryCards(results[0]);
-        updateTopSellersTable(results[1]);
-        updateDirectSalesTable(results[2]);
-        initCharts(results[3]);
-        updateAllAgentsTable(results[4]);
-        updateTimeSegments('booking', results[5]);
-        updateTimeSegments('flight', results[6]);
+        updateSummaryCards(data.summary);
+        updateTopSellersTable(data.top_sellers);
+        updateDirectSalesTable(data.direct_sales);
+        initCharts(data.sales_trend);
+        updateAllAgentsTable(data.all_agents);
+        updateTimeSegments('booking', data.segments.booking);
+        updateTimeSegments('flight', data.segments.flight);
         
     } catch (error) {
         showError('Ошибка загрузки данных: ' + error.message);
@@ -196,7 +196,56 @@ function renderComparisonResults(data) {
     });
 
     html += '</tbody></table></div>';
+    html += '<div class="chart-container mt-3"><canvas id="comparisonChart"></canvas></div>';
     container.innerHTML = html;
+    renderComparisonChart(data);
+}
+
+// График агентского вознаграждения по месяцам из рядов ответа сравнения
+function renderComparisonChart(data) {
+    const ctx = document.getElementById('comparisonChart');
+    if (!ctx) return;
+
+    if (window.comparisonChart instanceof Chart) {
+        window.comparisonChart.destroy();
+    }
+
+    const labels = [...new Set(data.flatMap(seller => seller.monthly.map(row => row.period)))].sort();
+    const datasets = data.map((seller, index) => {
+        const values = Object.fromEntries(seller.monthly.map(row => [row.period, row.agent]));
+        return {
+            label: seller.seller,
+            data: labels.map(period => values[period] || 0),
+            borderColor: `hsl(${(index * 137) % 360}, 65%, 50%)`,
+            fill: false,
+            tension: 0.3
+        };
+    });
+
+    window.comparisonChart = new Chart(ctx, {
+        type: 'line',
+        data: { labels, datasets },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                tooltip: {
+                    callbacks: {
+                        label: (context) =>
+                            `${context.dataset.label}: ${formatCurrency(context.raw)}`
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        callback: (value) => formatCurrency(value)
+                    }
+                }
+            }
+        }
+    });
 }
 
 // Утилитная функция для форматирования валюты
@@ -221,6 +270,41 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Таблица событий: первая страница отрисована сервером, следующие страницы,
+// сортировка и поиск загружаются из /api/seller-events с фильтрами страницы
+function setupEventsTable() {
+    const tbody = document.querySelector('#sellerEventsTable tbody');
+    const loadMore = document.getElementById('eventsLoadMore');
+    if (!tbody || !loadMore) return;
+
+    const pageParams = new URLSearchParams(window.location.search);
+    createPagedTable({
+        url: '/api/seller-events',
+        tbody,
+        loadMore,
+        searchInput: document.getElementById('eventsSearch'),
+        totalLabel: document.getElementById('eventsTotal'),
+        sort: 'agent_amount',
+        params: () => {
+            const params = new URLSearchParams();
+            params.append('seller', window.sellerName);
+            const year = pageParams.get('year');
+            if (/^\d+$/.test(year || '')) params.append('year', year);
+            pageParams.getAll('events').forEach(event => params.append('events', event));
+            return params;
+        },
+        renderRow: event => `
+            <tr>
+                <td>${escapeHtml(event.event_name)}</td>
+                <td>${event.tickets_count}</td>
+                <td>${formatCurrency(event.agent_amount)}</td>
+                <td>${formatCurrency(event.system_amount)}</td>
+                <td>${formatCurrency(event.order_amount)}</td>
+            </tr>
+        `
+    });
+}
+
 function updateEventsFilter() {
     const year = document.getElementById('yearFilter').value;
     const sellerName = new URLSearchParams(window.location.search).get('name');
@@ -256,5 +340,6 @@ document.addEventListener('DOMContentLoaded', () => {
     setupSellerFilters();
     initChart();
     setupComparison();
+    setupEventsTable();
     loadSellerData();
 });
\ No newline at end of file
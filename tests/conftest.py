@@ -0,0 +1,33 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# Тесты не трогают рабочую базу, файловый кэш и журнал приложения:
+# настройки читаются из окружения при первом импорте config
+TEST_DIR = Path(tempfile.mkdtemp(prefix='ticket-analytics-tests-'))
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ.update({
+    'DATABASE_PATH': str(TEST_DIR / 'tickets.db'),
+    'DATABASE_SNAPSHOT_DIR': '',
+    'CACHE_TYPE': 'NullCache',
+    'CACHE_WARMUP': '0',
+    'ANALYTICS_ENGINE': 'sql',
+    'SLOW_QUERY_LOG': str(TEST_DIR / 'slow_queries.log'),
+})
+
+# Небольшая выгрузка для проверок поведения
+FIXTURE_ROWS = 1000
+
+@pytest.fixture(scope='session')
+def orders_csv(tmp_path_factory):
+    from bench.generate import write_csv
+    return write_csv(tmp_path_factory.mktemp('csv') / 'orders.csv', FIXTURE_ROWS, seed=3)
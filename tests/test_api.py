@@ -0,0 +1,75 @@
+"""Проверка параметров API: курсоры постраничной выдачи и тело сравнения продавцов"""
+import pytest
+
+from config import Config
+from data.import_data import import_csv_to_sqlite
+from models.pagination import encode_cursor
+from models.queries import COMPARE_LIMIT
+
+@pytest.fixture(scope='module')
+def client(orders_csv):
+    import_csv_to_sqlite(orders_csv, Config.DATABASE_PATH)
+    # Приложение обслуживает базу при импорте модуля, поэтому импортируется
+    # после загрузки выгрузки
+    from app import app
+    return app.test_client()
+
+def _all_pages(client, url, params):
+    items, after = [], None
+    while True:
+        page = client.get(url, query_string={**params, 'limit': 7, 'after': after or ''}).get_json()
+        items += page['items']
+        after = page['next']
+        if after is None:
+            return items, page['total']
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_all_agents_cursor_walks_every_row_once(client, order):
+    items, total = _all_pages(client, '/api/all-agents', {'sort': 'agent_amount', 'order': order})
+    amounts = [item['agent_amount'] for item in items]
+
+    assert len(items) == total
+    assert len({item['seller'] for item in items}) == total
+    assert amounts == sorted(amounts, reverse=order == 'desc')
+
+@pytest.mark.parametrize('url, query', [
+    ('/api/all-agents', {}),
+    ('/api/seller-events', {'seller': 'Продавец 0'}),
+], ids=['all-agents', 'seller-events'])
+@pytest.mark.parametrize('params', [
+    {'after': 'not a cursor'},
+    {'after': encode_cursor([1])},
+    {'after': encode_cursor({'key': 1})},
+    # Курсор таблицы, отсортированной по названию, при сортировке по сумме
+    {'after': encode_cursor(['Продавец 1', 'Продавец 1']), 'sort': 'agent_amount'},
+    {'sort': 'unknown'},
+    {'order': 'sideways'},
+    {'limit': 0},
+    {'limit': 'many'},
+], ids=['garbage', 'short', 'object', 'other-sort', 'sort', 'order', 'limit', 'limit-text'])
+def test_bad_page_params_return_400(client, url, query, params):
+    response = client.get(url, query_string={**query, **params})
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_compare_sellers(client):
+    response = client.post('/api/compare-sellers', json={'sellers': ['Продавец 0', 'Продавец 1']})
+
+    assert response.status_code == 200
+    assert [item['seller'] for item in response.get_json()] == ['Продавец 0', 'Продавец 1']
+
+@pytest.mark.parametrize('kwargs', [
+    {'json': {'sellers': [f'Продавец {i}' for i in range(COMPARE_LIMIT + 1)]}},
+    {'json': {'sellers': []}},
+    {'json': {'sellers': 'Продавец 0'}},
+    {'json': {'sellers': [1, 2]}},
+    {'json': ['Продавец 0']},
+    {'data': 'sellers=Продавец 0', 'content_type': 'application/x-www-form-urlencoded'},
+    {'data': '{not json', 'content_type': 'application/json'},
+], ids=['too-many', 'empty', 'string', 'numbers', 'list-body', 'form', 'invalid-json'])
+def test_bad_compare_body_returns_400(client, kwargs):
+    response = client.post('/api/compare-sellers', **kwargs)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,29 @@
+"""Регрессионная проверка планов запросов (models.indexes.PLAN_CHECKS) на
+базе, загруженной импортером: обычным инкрементальным и массовым импортом"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from bench.generate import write_csv
+from data.import_data import import_csv_to_sqlite
+from models.indexes import verify_query_plans
+
+ROWS = 5000
+
+@pytest.fixture(scope='module')
+def csv_path(tmp_path_factory):
+    return write_csv(tmp_path_factory.mktemp('csv') / 'orders.csv', ROWS, seed=1)
+
+@pytest.mark.parametrize('bulk', [False, True], ids=['incremental', 'bulk'])
+def test_query_plans_use_expected_indexes(csv_path, tmp_path, bulk):
+    db_path = tmp_path / 'tickets.db'
+    import_csv_to_sqlite(csv_path, db_path, bulk=bulk)
+
+    with closing(sqlite3.connect(db_path)) as conn:
+        failures = verify_query_plans(conn)
+
+    assert not failures, '\n'.join(
+        f"{name}: ожидался индекс {index_name}, план: {'; '.join(plan)}"
+        for name, index_name, plan in failures
+    )
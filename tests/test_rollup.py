@@ -0,0 +1,232 @@
+"""Панели дашборда, итоги и страница продавца по seller_month_rollup и
+seller_summary совпадают с теми же правилами выручки, посчитанными
+напрямую по tickets, — после первого импорта и после повторного импорта
+выгрузки с измененными и новыми заказами"""
+import csv
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from config import Config
+from data.import_data import import_csv_to_sqlite
+from models.database import close_db_connection
+from models.queries import (
+    build_seller_page, get_all_agents, get_direct_sales, get_seller_stats, get_summary_stats,
+    get_top_sellers, seller_page_loaders, TOP_SELLERS_LIMIT,
+)
+from models.rollup import KEY_COLUMNS, MEASURES, rebuild_rollup
+
+RETURNED = "payment_status = 'Возвращен'"
+UNREWARDED = "agent_amount = 0 AND agent_percent > 0 AND payment_status = 'Оплачен'"
+DIRECT = "seller = organizer AND agent_percent < 0"
+REVENUE = (f"SUM(order_amount)"
+           f" - SUM(CASE WHEN {RETURNED} THEN refund_amount ELSE 0 END)"
+           f" - SUM(CASE WHEN {UNREWARDED} THEN order_amount ELSE 0 END)")
+
+def _amount(value):
+    return f"{value:.2f}".replace('.', ',')
+
+def _number(value):
+    return float(value.replace(',', '.'))
+
+def write_reexport(source, path, new_orders=50):
+    """Повторная выгрузка: все заказы source, часть из них изменена
+    (возвраты, отмена возврата, снятое вознаграждение, другой продавец и
+    год), плюс new_orders новых заказов"""
+    with open(source, encoding='utf-8-sig', newline='') as f:
+        header, *rows = list(csv.reader(f, delimiter=';'))
+    column = {name: i for i, name in enumerate(header)}
+
+    def set_value(row, name, value):
+        row[column[name]] = value
+
+    for number, row in enumerate(rows):
+        order_amount = _number(row[column['Сумма заказа']])
+        change = number % 8
+        if change == 0:
+            # Полный возврат
+            set_value(row, 'Статус оплаты', 'Возвращен')
+            set_value(row, 'Сумма возврата', _amount(order_amount))
+        elif change == 1:
+            # Частичный возврат
+            set_value(row, 'Статус оплаты', 'Возвращен')
+            set_value(row, 'Сумма возврата', _amount(order_amount / 2))
+        elif change == 2:
+            # Возврат отменен
+            set_value(row, 'Статус оплаты', 'Оплачен')
+            set_value(row, 'Сумма возврата', _amount(0))
+        elif change == 3:
+            # Вознаграждение не начислено
+            set_value(row, 'Сумма агентского вознаграждения', _amount(0))
+        elif change == 4:
+            # Заказ переходит к другому продавцу и в другой год
+            set_value(row, 'Компания-продавец (название)', rows[number - 1][column['Компания-продавец (название)']])
+            set_value(row, 'Дата оформления', '2025-03-15')
+
+    new = [[f'N{number:09d}', *row[1:]] for number, row in enumerate(rows[:new_orders])]
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';', quotechar='"')
+        writer.writerow(header)
+        writer.writerows(rows + new)
+    return path
+
+@pytest.fixture(params=['import', 'reimport'])
+def database(request, orders_csv, tmp_path, monkeypatch):
+    """База после импорта выгрузки или после ее повторного импорта с изменениями"""
+    db_path = tmp_path / 'tickets.db'
+    import_csv_to_sqlite(orders_csv, db_path)
+    if request.param == 'reimport':
+        import_csv_to_sqlite(write_reexport(orders_csv, tmp_path / 'reexport.csv'), db_path)
+
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(db_path))
+    close_db_connection()
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        yield conn
+    close_db_connection()
+
+def _rows(conn, query, params=()):
+    return [dict(row) for row in conn.execute(query, params)]
+
+def assert_sellers_match(actual, expected):
+    actual = {row['seller']: row for row in actual}
+    expected = {row['seller']: row for row in expected}
+    assert actual.keys() == expected.keys()
+    for seller, row in expected.items():
+        assert actual[seller] == pytest.approx(row), seller
+
+def summary_stats(conn, condition='1', params=()):
+    """Итоги по tickets: все заказы, кроме неоплаченных"""
+    row = conn.execute(f'''
+        SELECT
+            {REVENUE} AS total_revenue,
+            SUM(agent_amount) AS total_agent,
+            SUM(system_amount) AS total_commission,
+            SUM(tickets_count)
+            - SUM(CASE WHEN {RETURNED} THEN tickets_count ELSE 0 END)
+            - SUM(CASE WHEN {UNREWARDED} THEN tickets_count ELSE 0 END)
+            - SUM(CASE WHEN {DIRECT} AND agent_amount = 0 AND payment_status = 'Оплачен'
+                       THEN tickets_count ELSE 0 END) AS total_orders,
+            COUNT(*) AS orders,
+            SUM(CASE WHEN {RETURNED} THEN refund_amount ELSE 0 END)
+            - SUM(CASE WHEN {RETURNED} AND {DIRECT} THEN refund_amount ELSE 0 END) AS total_refunds,
+            AVG(CASE WHEN {RETURNED} AND refund_amount > 0 THEN refund_amount END) AS avg_refund
+        FROM tickets
+        WHERE payment_status != 'Не оплачен' AND {condition}
+    ''', params).fetchone()
+    stats = dict(row)
+    stats['avg_order'] = stats['total_revenue'] / stats.pop('orders')
+    stats['avg_refund'] = stats['avg_refund'] or 0
+    return stats
+
+@pytest.mark.parametrize('filters, condition, params', [
+    (None, '1', ()),
+    ({'year': '2022'}, 'year = ?', (2022,)),
+    ({'status': 'Возвращен'}, 'payment_status = ?', ('Возвращен',)),
+], ids=['all', 'year', 'status'])
+def test_summary_matches_tickets(database, filters, condition, params):
+    assert get_summary_stats(filters) == pytest.approx(summary_stats(database, condition, params))
+
+def test_top_sellers_match_tickets(database):
+    expected = _rows(database, f'''
+        SELECT seller, SUM(agent_amount) AS agent_amount, SUM(system_amount) AS system_amount,
+               SUM(tickets_count) AS orders_count
+        FROM tickets
+        WHERE agent_amount > 0
+        GROUP BY seller
+        ORDER BY agent_amount DESC
+        LIMIT {TOP_SELLERS_LIMIT}
+    ''')
+    top_sellers = get_top_sellers()
+    assert [row['seller'] for row in top_sellers] == [row['seller'] for row in expected]
+    assert top_sellers == [pytest.approx(row) for row in expected]
+
+def test_direct_sales_match_tickets(database):
+    expected = _rows(database, f'''
+        SELECT seller, SUM(organizer_amount) AS direct_sales, SUM(system_amount) AS system_commission,
+               SUM(tickets_count) AS orders_count, {REVENUE} AS total_revenue
+        FROM tickets
+        WHERE agent_amount = 0 AND agent_percent < 0 AND payment_status != 'Не оплачен'
+          AND refund_amount != order_amount AND seller = organizer
+        GROUP BY seller
+    ''')
+    assert expected
+    assert_sellers_match(get_direct_sales(), expected)
+
+def test_all_agents_match_tickets(database):
+    expected = _rows(database, f'''
+        SELECT seller, SUM(agent_amount) AS agent_amount, SUM(system_amount) AS system_amount,
+               COUNT(*) AS orders_count, SUM(tickets_count) AS tickets_count,
+               {REVENUE} AS total_revenue
+        FROM tickets
+        WHERE payment_status != 'Не оплачен' AND refund_amount != order_amount AND agent_amount > 0
+        GROUP BY seller
+    ''')
+    assert_sellers_match(get_all_agents(), expected)
+
+def test_seller_stats_summary_matches_tickets(database):
+    """Итоги продавца из seller_summary (по продавцу и году) совпадают с tickets"""
+    pairs = database.execute('''
+        SELECT DISTINCT seller, year FROM tickets WHERE payment_status != 'Не оплачен'
+    ''').fetchall()
+    sellers = {seller for seller, _ in pairs}
+    checks = [(seller, str(year)) for seller, year in pairs] + [(seller, None) for seller in sellers]
+    for seller, year in checks:
+        condition, params = 'seller = ?', (seller,)
+        if year is not None:
+            condition, params = 'seller = ? AND year = ?', (seller, int(year))
+        expected = summary_stats(database, condition, params)
+        expected.pop('avg_refund')
+        assert get_seller_stats({'seller': seller, 'year': year}) == pytest.approx(expected), (seller, year)
+
+def test_seller_page_matches_tickets(database):
+    """Карточки страницы продавца: оплаченные заказы без полного возврата"""
+    sellers = [row[0] for row in database.execute('SELECT DISTINCT seller FROM tickets')]
+    for seller in sellers:
+        summary, rows = (load() for load in seller_page_loaders(seller))
+        page = build_seller_page(seller, summary, rows)
+        expected = dict(database.execute(f'''
+            SELECT
+                COUNT(*) AS orders,
+                {REVENUE} AS total_revenue,
+                SUM(agent_amount) AS total_agent,
+                SUM(system_amount) AS total_commission,
+                SUM(tickets_count) AS total_orders,
+                SUM(CASE WHEN {RETURNED} THEN refund_amount ELSE 0 END) AS total_refunds,
+                AVG(CASE WHEN {RETURNED} AND refund_amount > 0 THEN refund_amount END) AS avg_refund
+            FROM tickets
+            WHERE seller = ? AND payment_status != 'Не оплачен' AND refund_amount != order_amount
+        ''', (seller,)).fetchone())
+        if not expected.pop('orders'):
+            assert page is None, seller
+            continue
+        expected['avg_order'] = expected['total_revenue'] / summary['paid_orders']
+        returned = database.execute(f'''
+            SELECT SUM(CASE WHEN refund_amount > 0 THEN refund_amount ELSE 0 END)
+            FROM tickets WHERE seller = ? AND {RETURNED}
+        ''', (seller,)).fetchone()[0] or 0
+
+        assert page['stats'] == pytest.approx({'seller': seller, **expected}), seller
+        assert page['total_refunds'] == pytest.approx(returned), seller
+
+def test_incremental_rollup_matches_rebuild(database):
+    """Агрегаты, которые импорт поддерживает вычитанием и добавлением
+    заказов (apply_orders), совпадают с полным пересчетом"""
+    keys = [column for column, _ in KEY_COLUMNS]
+    measures = [column for column, _ in MEASURES]
+
+    def rollup():
+        return {
+            tuple(row[key] for key in keys): {measure: row[measure] for measure in measures}
+            for row in database.execute('SELECT * FROM seller_month_rollup')
+        }
+
+    maintained = rollup()
+    rebuild_rollup(database)
+    rebuilt = rollup()
+    database.rollback()
+
+    assert maintained.keys() == rebuilt.keys()
+    for key, measures in rebuilt.items():
+        assert maintained[key] == pytest.approx(measures), key